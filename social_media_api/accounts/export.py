@@ -0,0 +1,76 @@
+"""
+Streaming export of everything a user wrote or received.
+
+Posts, comments, likes and notifications are read table by table with
+``iterator(chunk_size=EXPORT_CHUNK_SIZE)`` (server-side cursors on
+PostgreSQL), rendered one row at a time by the compiled serializers (see
+social_media_api.compiled_serializers) as NDJSON lines of
+``{"type": ..., "data": {...}}``, and gzip-compressed as they go. Only one
+chunk of rows and one block of output are held in memory, whatever the size
+of the account.
+"""
+import zlib
+
+from django.conf import settings
+
+from notifications.models import Notification
+from notifications.serializers import NotificationExportSerializer
+from posts.models import Comment, Like, Post
+from posts.serializers import CommentSerializer, LikeSerializer, PostSerializer
+from social_media_api.compiled_serializers import compile_serializer
+from social_media_api.renderers import FastJSONRenderer
+
+EXPORT_DEFAULTS = {
+    'EXPORT_CHUNK_SIZE': 2000,
+    'EXPORT_GZIP_LEVEL': 6,
+}
+
+# Compressed output is handed on once it reaches this many bytes
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+
+def export_setting(name):
+    return getattr(settings, name, EXPORT_DEFAULTS[name])
+
+
+def export_tables(user):
+    """(line type, queryset, serializer class) for every table in the export, in order."""
+    return [
+        ('post', Post.objects.filter(author=user), PostSerializer),
+        ('comment', Comment.objects.filter(author=user), CommentSerializer),
+        ('like', Like.objects.filter(user=user), LikeSerializer),
+        ('notification', Notification.objects.filter(recipient=user), NotificationExportSerializer),
+    ]
+
+
+def iter_export_lines(user, chunk_size=None):
+    """NDJSON lines (bytes) of the export of ``user``."""
+    chunk_size = chunk_size or export_setting('EXPORT_CHUNK_SIZE')
+    renderer = FastJSONRenderer()
+    for line_type, queryset, serializer_class in export_tables(user):
+        compiled = compile_serializer(serializer_class)
+        for data in compiled.iterator(queryset.order_by('pk'), chunk_size):
+            yield renderer.render({'type': line_type, 'data': data}) + b'\n'
+
+
+def gzip_stream(chunks, level=None):
+    """Gzip ``chunks`` of bytes incrementally, yielding blocks of compressed output."""
+    compressor = zlib.compressobj(export_setting('EXPORT_GZIP_LEVEL') if level is None else level,
+                                  zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    block = []
+    size = 0
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            block.append(compressed)
+            size += len(compressed)
+            if size >= EXPORT_BLOCK_SIZE:
+                yield b''.join(block)
+                block, size = [], 0
+    block.append(compressor.flush())
+    yield b''.join(block)
+
+
+def export_user_data(user, chunk_size=None):
+    """Gzip-compressed NDJSON export of ``user``, as an iterator of bytes."""
+    return gzip_stream(iter_export_lines(user, chunk_size))
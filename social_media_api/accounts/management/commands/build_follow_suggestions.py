@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import SuggestionRefresh
+from accounts.suggestions import FollowGraph, build_suggestions, refresh_marked_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Compute friends-of-friends follow suggestions from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only rebuild users whose follows changed since the last run, and their followers')
+
+    def handle(self, *args, **options):
+        marks_before = timezone.now()
+        started = time.perf_counter()
+        graph = FollowGraph.load()
+        loaded = time.perf_counter()
+        self.stdout.write(f'Loaded {len(graph.indices)} edges between {len(graph.user_ids)} users '
+                          f'in {loaded - started:.1f}s')
+
+        if options['incremental']:
+            written = refresh_marked_suggestions(graph=graph)
+        else:
+            written = build_suggestions(graph=graph)
+            # A full rebuild covers every change made before the graph was loaded
+            SuggestionRefresh.objects.filter(marked_at__lte=marks_before).delete()
+        self.stdout.write(f'Rebuilt suggestions for {written} users in {time.perf_counter() - loaded:.1f}s')
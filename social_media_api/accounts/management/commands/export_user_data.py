@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.export import export_user_data
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Write a user's posts, comments, likes and notifications as gzip-compressed NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per round trip (default: EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No user named {options["username"]!r}')
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for block in export_user_data(user, options['chunk_size']):
+                output.write(block)
+                written += len(block)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(f'Wrote {written} bytes to {options["output"]}')
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_followers_to_following(apps, schema_editor):
+    # A row (from=X, to=Y) in the old followers table means Y follows X
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Followers = CustomUser._meta.get_field('followers').remote_field.through
+    Following = CustomUser._meta.get_field('following').remote_field.through
+    Following.objects.bulk_create(
+        [
+            Following(from_customuser_id=row.to_customuser_id, to_customuser_id=row.from_customuser_id)
+            for row in Followers.objects.all().iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def copy_following_to_followers(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Followers = CustomUser._meta.get_field('followers').remote_field.through
+    Following = CustomUser._meta.get_field('following').remote_field.through
+    Followers.objects.bulk_create(
+        [
+            Followers(from_customuser_id=row.to_customuser_id, to_customuser_id=row.from_customuser_id)
+            for row in Following.objects.all().iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='following',
+            field=models.ManyToManyField(blank=True, related_name='followers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_followers_to_following, copy_following_to_followers),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='followers',
+        ),
+    ]
@@ -4,8 +4,55 @@ from django.db import models
 class CustomUser(AbstractUser):
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
-    followers = models.ManyToManyField('self', symmetrical=False, blank=True)
-    following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
+    # Both directions read the same Follow edges
+    following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True,
+                                       through='Follow', through_fields=('follower', 'followee'))
+    # Denormalized counters, kept in step by the follow views and repaired by reconcile_counters
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.username
+
+
+class Follow(models.Model):
+    # One row per follow relationship; the single source for followers, following and feeds
+    follower = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='following_edges')
+    followee = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='follower_edges')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='follow_unique_edge'),
+        ]
+        indexes = [
+            # "Who does X follow" and "who follows X", newest first, keyset paginated
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+            models.Index(fields=['followee', '-created_at', '-id'], name='follow_followee_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower} follows {self.followee}'
+
+
+class FollowSuggestion(models.Model):
+    # Precomputed "who to follow" rows, rebuilt by build_follow_suggestions
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    # How many accounts followed by ``user`` already follow ``suggested``
+    mutual_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='follow_suggestion_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_count', 'suggested'], name='follow_suggestion_rank_idx'),
+        ]
+
+
+class SuggestionRefresh(models.Model):
+    # Users whose outgoing edges changed since suggestions were last built
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marked_at = models.DateTimeField(auto_now=True)
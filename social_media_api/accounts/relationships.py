@@ -0,0 +1,71 @@
+"""
+Relationship flags between a viewer and a batch of users.
+
+"You follow" comes from the viewer's following set, which is cached for
+FOLLOWING_CACHE_TIMEOUT seconds and dropped whenever the viewer follows or
+unfollows someone. "Follows you" is one ``follower_id IN (...)`` query over
+the Follow edges pointing at the viewer, so a whole page of users costs at
+most two queries however many rows it has.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+FOLLOWING_CACHE_TIMEOUT = getattr(settings, 'FOLLOWING_CACHE_TIMEOUT', 30)
+# Viewers following more accounts than this are looked up per batch instead of cached whole
+FOLLOWING_CACHE_MAX_SIZE = getattr(settings, 'FOLLOWING_CACHE_MAX_SIZE', 5000)
+RELATIONSHIP_LOOKUP_MAX_IDS = getattr(settings, 'RELATIONSHIP_LOOKUP_MAX_IDS', 300)
+
+
+def following_cache_key(user_id):
+    return f'accounts:following:{user_id}'
+
+
+def get_following_ids(user_id, user_ids):
+    """The subset of ``user_ids`` followed by ``user_id``."""
+    following = cache.get(following_cache_key(user_id))
+    if following is None:
+        edges = Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True)
+        following = set(edges[:FOLLOWING_CACHE_MAX_SIZE + 1])
+        if len(following) > FOLLOWING_CACHE_MAX_SIZE:
+            return set(edges.filter(followee_id__in=user_ids))
+        cache.set(following_cache_key(user_id), following, FOLLOWING_CACHE_TIMEOUT)
+    return following.intersection(user_ids)
+
+
+def get_follower_ids(user_id, user_ids):
+    """The subset of ``user_ids`` following ``user_id``."""
+    return set(Follow.objects.filter(followee_id=user_id, follower_id__in=user_ids)
+               .values_list('follower_id', flat=True))
+
+
+def relationship_flags(following, followed_by):
+    return {'following': following, 'followed_by': followed_by, 'mutual': following and followed_by}
+
+
+def lookup_relationships(viewer_id, user_ids):
+    """``{user_id: flags}`` for every id in ``user_ids`` as seen by ``viewer_id``."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    following = get_following_ids(viewer_id, user_ids)
+    followed_by = get_follower_ids(viewer_id, user_ids)
+    return {user_id: relationship_flags(user_id in following, user_id in followed_by) for user_id in user_ids}
+
+
+class RelationshipLookup:
+    """Per-request memo of relationship flags, filled a page at a time by serializers."""
+
+    def __init__(self, viewer_id):
+        self.viewer_id = viewer_id
+        self.flags = {}
+
+    def prime(self, user_ids):
+        missing = set(user_ids) - self.flags.keys()
+        self.flags.update(lookup_relationships(self.viewer_id, missing))
+
+    def get(self, user_id):
+        if user_id not in self.flags:
+            self.prime([user_id])
+        return self.flags[user_id]
@@ -2,6 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
 
+from .relationships import RELATIONSHIP_LOOKUP_MAX_IDS, RelationshipLookup
+
 # Get the custom user model
 User = get_user_model()
 fild=serializers.CharField()
@@ -27,3 +29,101 @@ class UserSerializer(serializers.ModelSerializer):
         # Create an authentication token for the user
         Token.objects.create(user=user)
         return user
+
+
+class RelationshipField(serializers.Field):
+    """
+    ``following`` / ``followed_by`` / ``mutual`` flags between the requesting
+    user and the user a row renders, or None for anonymous requests.
+
+    The rendered user's id comes from ``get_relationship_user_id`` on the
+    parent serializer when it defines one, otherwise from ``instance.pk``.
+    Use with RelationshipListSerializer so a page is looked up in one batch.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        lookup = relationship_lookup(self.context)
+        if lookup is None:
+            return None
+        return lookup.get(relationship_user_id(self.parent, instance))
+
+
+def relationship_user_id(serializer, instance):
+    resolve = getattr(serializer, 'get_relationship_user_id', None)
+    return resolve(instance) if resolve else instance.pk
+
+
+def relationship_lookup(context):
+    request = context.get('request')
+    if request is None or not request.user.is_authenticated:
+        return None
+    if 'relationships' not in context:
+        context['relationships'] = RelationshipLookup(request.user.pk)
+    return context['relationships']
+
+
+class RelationshipListSerializer(serializers.ListSerializer):
+    # Looks up the relationship flags of a whole page before rendering its rows
+    def to_representation(self, data):
+        items = data.all() if hasattr(data, 'all') else data
+        lookup = relationship_lookup(self.context)
+        if lookup is not None:
+            items = list(items)
+            lookup.prime(relationship_user_id(self.child, item) for item in items)
+        return super().to_representation(items)
+
+
+class UserProfileSerializer(serializers.ModelSerializer):
+    relationship = RelationshipField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'bio', 'profile_picture', 'followers_count', 'following_count', 'relationship']
+        read_only_fields = fields
+        list_serializer_class = RelationshipListSerializer
+
+
+class FollowEdgeSerializer(serializers.Serializer):
+    # One follow edge seen from the user on the other end ('follower' or 'followee')
+    id = serializers.SerializerMethodField()
+    username = serializers.SerializerMethodField()
+    followed_at = serializers.DateTimeField(source='created_at')
+    relationship = RelationshipField()
+
+    class Meta:
+        list_serializer_class = RelationshipListSerializer
+
+    def _user(self, edge):
+        return getattr(edge, self.context['edge_user'])
+
+    def get_id(self, edge):
+        return self._user(edge).pk
+
+    def get_username(self, edge):
+        return self._user(edge).username
+
+    def get_relationship_user_id(self, edge):
+        return getattr(edge, f"{self.context['edge_user']}_id")
+
+
+class FollowSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='suggested_id')
+    username = serializers.CharField(source='suggested.username')
+    mutual_count = serializers.IntegerField()
+    relationship = RelationshipField()
+
+    class Meta:
+        list_serializer_class = RelationshipListSerializer
+
+    def get_relationship_user_id(self, suggestion):
+        return suggestion.suggested_id
+
+
+class RelationshipLookupSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                max_length=RELATIONSHIP_LOOKUP_MAX_IDS)
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import CustomUser, Follow, SuggestionRefresh
+from .relationships import following_cache_key
+
+# Sent once per follow edge created or removed, with ``follower_id`` and ``followee_id``, however
+# the edge was written: Follow saves and deletes, or CustomUser.following.add()/remove()/clear(),
+# which write in bulk and send no post_save/post_delete. Everything kept in step with the follow
+# graph (counters, feeds, suggestions, cached following sets) listens to these two.
+followed = Signal()
+unfollowed = Signal()
+
+
+@receiver(post_save, sender=Follow)
+def send_followed(sender, instance, created, **kwargs):
+    if created:
+        followed.send(sender=Follow, follower_id=instance.follower_id, followee_id=instance.followee_id)
+
+
+@receiver(post_delete, sender=Follow)
+def send_unfollowed(sender, instance, **kwargs):
+    unfollowed.send(sender=Follow, follower_id=instance.follower_id, followee_id=instance.followee_id)
+
+
+@receiver(m2m_changed, sender=Follow)
+def send_following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # ``reverse`` is set for user.followers.add(...): the instance is then the followee
+    if action in ('pre_remove', 'pre_clear'):
+        # remove() names ids that may not be followed, clear() names none: read the real edges first
+        edges = Follow.objects.filter(**{'followee' if reverse else 'follower': instance})
+        if pk_set is not None:
+            edges = edges.filter(**{'follower_id__in' if reverse else 'followee_id__in': pk_set})
+        instance._removed_follow_edges = list(edges.values_list('follower_id', 'followee_id'))
+    elif action == 'post_add':
+        # pk_set only holds the ids that were not followed yet
+        for pk in pk_set:
+            follower_id, followee_id = (pk, instance.pk) if reverse else (instance.pk, pk)
+            followed.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+    elif action in ('post_remove', 'post_clear'):
+        for follower_id, followee_id in instance.__dict__.pop('_removed_follow_edges', []):
+            unfollowed.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+
+
+def _adjust_follow_counts(follower_id, followee_id, delta):
+    # Never drive a drifted counter below zero; reconcile_counters repairs drift
+    follower = CustomUser.objects.filter(pk=follower_id)
+    followee = CustomUser.objects.filter(pk=followee_id)
+    if delta < 0:
+        follower = follower.filter(following_count__gt=0)
+        followee = followee.filter(followers_count__gt=0)
+    follower.update(following_count=F('following_count') + delta)
+    followee.update(followers_count=F('followers_count') + delta)
+
+
+@receiver(followed)
+def count_follow(sender, follower_id, followee_id, **kwargs):
+    _adjust_follow_counts(follower_id, followee_id, 1)
+
+
+@receiver(unfollowed)
+def count_unfollow(sender, follower_id, followee_id, **kwargs):
+    _adjust_follow_counts(follower_id, followee_id, -1)
+
+
+@receiver(followed)
+@receiver(unfollowed)
+def mark_suggestions(sender, follower_id, **kwargs):
+    SuggestionRefresh.objects.update_or_create(user_id=follower_id)
+
+
+@receiver(followed)
+@receiver(unfollowed)
+def forget_cached_following(sender, follower_id, **kwargs):
+    key = following_cache_key(follower_id)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,146 @@
+"""
+Friends-of-friends follow suggestions.
+
+The follow graph is loaded once into CSR adjacency arrays: ``indices`` holds
+the followees of every user back to back and ``indptr[u]:indptr[u + 1]`` is
+the slice belonging to dense user index ``u``. The candidates for a user are
+the followees of their followees, counted with ``numpy.unique``; accounts
+already followed (and the user themselves) are masked out and the top
+FOLLOW_SUGGESTIONS_PER_USER by mutual count are written to FollowSuggestion.
+
+Follows and unfollows only mark the follower in SuggestionRefresh. A user's
+candidates depend on their own edges and on the edges of everyone they
+follow, so an incremental refresh rebuilds the marked users plus their
+followers.
+"""
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Follow, FollowSuggestion, SuggestionRefresh
+
+SUGGESTION_DEFAULTS = {
+    # How many suggestions are stored per user
+    'FOLLOW_SUGGESTIONS_PER_USER': 20,
+    # Edges fetched per round trip while loading the graph
+    'FOLLOW_SUGGESTIONS_LOAD_CHUNK_SIZE': 50000,
+    # Users whose suggestions are replaced per transaction
+    'FOLLOW_SUGGESTIONS_WRITE_BATCH_SIZE': 1000,
+}
+
+
+def suggestion_setting(name):
+    return getattr(settings, name, SUGGESTION_DEFAULTS[name])
+
+
+class FollowGraph:
+    """Follow edges as CSR arrays over dense user indexes."""
+
+    def __init__(self, followers, followees):
+        self.user_ids = np.unique(np.concatenate([followers, followees]))
+        src = np.searchsorted(self.user_ids, followers)
+        dst = np.searchsorted(self.user_ids, followees)
+        order = np.argsort(src, kind='stable')
+        self.src = src[order]
+        self.indices = dst[order]
+        self.indptr = np.zeros(len(self.user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=len(self.user_ids)), out=self.indptr[1:])
+
+    @classmethod
+    def load(cls, chunk_size=None):
+        chunk_size = chunk_size or suggestion_setting('FOLLOW_SUGGESTIONS_LOAD_CHUNK_SIZE')
+        edges = Follow.objects.order_by().values_list('follower_id', 'followee_id').iterator(chunk_size=chunk_size)
+        flat = np.fromiter(chain.from_iterable(edges), dtype=np.int64)
+        flat = flat.reshape(-1, 2)
+        return cls(flat[:, 0], flat[:, 1])
+
+    def index_of(self, user_ids):
+        """Dense indexes of the given user ids that have at least one edge."""
+        user_ids = np.asarray(list(user_ids), dtype=np.int64)
+        positions = np.searchsorted(self.user_ids, user_ids)
+        positions = positions[positions < len(self.user_ids)]
+        return positions[np.isin(self.user_ids[positions], user_ids)]
+
+    def followers_of(self, rows):
+        """Dense indexes of everyone following any of ``rows``."""
+        return np.unique(self.src[np.isin(self.indices, rows)])
+
+    def suggestions_for(self, row, limit):
+        """``(dense index, mutual count)`` arrays of the top ``limit`` candidates for ``row``."""
+        followed = self.indices[self.indptr[row]:self.indptr[row + 1]]
+        if not len(followed):
+            return followed, followed
+        starts, ends = self.indptr[followed], self.indptr[followed + 1]
+        lengths = ends - starts
+        # Concatenate the followee slices of every followee without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        two_hop = self.indices[offsets + np.arange(lengths.sum())]
+        candidates, counts = np.unique(two_hop, return_counts=True)
+        keep = ~np.isin(candidates, followed) & (candidates != row)
+        candidates, counts = candidates[keep], counts[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-counts, limit - 1)[:limit]
+            candidates, counts = candidates[top], counts[top]
+        # Highest mutual count first, lowest id breaks ties
+        order = np.lexsort((candidates, -counts))
+        return candidates[order], counts[order]
+
+
+def build_suggestions(user_ids=None, graph=None):
+    """
+    Rebuild stored suggestions and return how many users were written.
+
+    ``user_ids=None`` rebuilds every user with outgoing edges; otherwise only
+    the given users and their followers are rebuilt.
+    """
+    graph = graph if graph is not None else FollowGraph.load()
+    limit = suggestion_setting('FOLLOW_SUGGESTIONS_PER_USER')
+    batch_size = suggestion_setting('FOLLOW_SUGGESTIONS_WRITE_BATCH_SIZE')
+
+    if user_ids is None:
+        rows = np.flatnonzero(np.diff(graph.indptr))
+    else:
+        user_ids = list(user_ids)
+        changed = graph.index_of(user_ids)
+        rows = np.union1d(changed, graph.followers_of(changed))
+        rows = rows[np.diff(graph.indptr)[rows] > 0]
+
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        suggestions = []
+        for row in batch:
+            owner_id = int(graph.user_ids[row])
+            candidates, counts = graph.suggestions_for(row, limit)
+            suggestions.extend(
+                FollowSuggestion(user_id=owner_id, suggested_id=int(graph.user_ids[candidate]), mutual_count=int(count))
+                for candidate, count in zip(candidates, counts)
+            )
+        owner_ids = graph.user_ids[batch].tolist()
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=owner_ids).delete()
+            FollowSuggestion.objects.bulk_create(suggestions, batch_size=batch_size)
+        written += len(batch)
+
+    # Users who no longer follow anyone only need their old rows removed
+    orphaned = FollowSuggestion.objects.filter(~Exists(Follow.objects.filter(follower_id=OuterRef('user_id'))))
+    if user_ids is not None:
+        orphaned = orphaned.filter(user_id__in=user_ids)
+    orphaned.delete()
+    return written
+
+
+def refresh_marked_suggestions(graph=None):
+    """Rebuild suggestions for users marked in SuggestionRefresh and clear their marks."""
+    started = timezone.now()
+    user_ids = list(SuggestionRefresh.objects.values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+    written = build_suggestions(user_ids, graph=graph)
+    # Users re-marked while we were running keep their newer mark
+    SuggestionRefresh.objects.filter(user_id__in=user_ids, marked_at__lte=started).delete()
+    return written
@@ -1,3 +1,213 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+from social_media_api.pagination import KeysetCursorPagination
+
+from .models import CustomUser, Follow, FollowSuggestion, SuggestionRefresh
+from .relationships import following_cache_key
+from .suggestions import build_suggestions
+
+
+class FollowTests(APITestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', password='password')
+        self.bob = CustomUser.objects.create_user(username='bob', password='password')
+        self.client.force_authenticate(user=self.alice)
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        url = reverse('follow_user', args=[self.bob.pk])
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(Follow.objects.filter(follower=self.alice, followee=self.bob).count(), 1)
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.followers_count, 1)
+
+        unfollow_url = reverse('unfollow_user', args=[self.bob.pk])
+        self.client.post(unfollow_url)
+        self.client.post(unfollow_url)
+        self.assertFalse(Follow.objects.exists())
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.followers_count, 0)
+
+    def test_related_manager_writes_keep_counters_and_marks(self):
+        carol = CustomUser.objects.create_user(username='carol', password='password')
+        self.alice.following.add(self.bob, carol)
+        self.alice.following.add(self.bob)
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (2, 1))
+        self.assertTrue(SuggestionRefresh.objects.filter(user=self.alice).exists())
+
+        self.alice.following.remove(self.bob, self.alice)  # Not following herself: no change for that one
+        carol.followers.clear()
+        self.alice.refresh_from_db()
+        carol.refresh_from_db()
+        self.assertEqual((self.alice.following_count, carol.followers_count), (0, 0))
+        self.assertFalse(Follow.objects.exists())
+
+    @mock.patch.object(KeysetCursorPagination, 'page_size', 2)
+    def test_follower_and_following_lists_are_paginated_newest_first(self):
+        others = [CustomUser.objects.create_user(username=f'user{i}', password='password') for i in range(3)]
+        for other in others:
+            Follow.objects.create(follower=other, followee=self.bob)
+        Follow.objects.create(follower=self.bob, followee=self.alice)
+
+        response = self.client.get(reverse('user_followers', args=[self.bob.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [row['username'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        names += [row['username'] for row in response.data['results']]
+        self.assertEqual(names, ['user2', 'user1', 'user0'])
+
+        response = self.client.get(reverse('user_following', args=[self.bob.pk]))
+        self.assertEqual([row['id'] for row in response.data['results']], [self.alice.pk])
+        self.assertIn('followed_at', response.data['results'][0])
+
+
+class FollowSuggestionTests(APITestCase):
+    def setUp(self):
+        self.users = {name: CustomUser.objects.create_user(username=name, password='password')
+                      for name in ['me', 'a', 'b', 'c', 'd', 'e']}
+        self._follow('me', 'a', 'b')
+        self._follow('a', 'c', 'd', 'me')
+        self._follow('b', 'c')
+
+    def _follow(self, follower, *followees):
+        for followee in followees:
+            Follow.objects.create(follower=self.users[follower], followee=self.users[followee])
+
+    def _suggested(self, name):
+        return list(FollowSuggestion.objects.filter(user=self.users[name])
+                    .order_by('-mutual_count', 'suggested_id')
+                    .values_list('suggested__username', 'mutual_count'))
+
+    def test_two_hop_candidates_are_ranked_by_mutual_count(self):
+        build_suggestions()
+        self.assertEqual(self._suggested('me'), [('c', 2), ('d', 1)])
+        # Accounts already followed and the user themselves are never suggested
+        self.assertEqual(self._suggested('a'), [('b', 1)])
+
+    def test_incremental_refresh_rebuilds_changed_users_and_their_followers(self):
+        call_command('build_follow_suggestions', stdout=StringIO())
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+        self._follow('b', 'e')
+        call_command('build_follow_suggestions', incremental=True, stdout=StringIO())
+        self.assertEqual(self._suggested('me'), [('c', 2), ('d', 1), ('e', 1)])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+        Follow.objects.filter(follower=self.users['me']).delete()
+        call_command('build_follow_suggestions', incremental=True, stdout=StringIO())
+        self.assertEqual(self._suggested('me'), [])
+
+    def test_endpoint_skips_accounts_followed_since_the_last_build(self):
+        build_suggestions()
+        self._follow('me', 'd')
+        self.client.force_authenticate(user=self.users['me'])
+        response = self.client.get(reverse('follow_suggestions'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['username'], row['mutual_count']) for row in response.data['results']], [('c', 2)])
+
+
+class RelationshipTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = CustomUser.objects.create_user(username='viewer', password='password')
+        self.friend, self.idol, self.fan, self.stranger = [
+            CustomUser.objects.create_user(username=name, password='password')
+            for name in ['friend', 'idol', 'fan', 'stranger']
+        ]
+        Follow.objects.bulk_create([
+            Follow(follower=self.viewer, followee=self.friend),
+            Follow(follower=self.friend, followee=self.viewer),
+            Follow(follower=self.viewer, followee=self.idol),
+            Follow(follower=self.fan, followee=self.viewer),
+        ])
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_batch_lookup_uses_two_queries_and_caches_following(self):
+        ids = ','.join(str(user.pk) for user in [self.friend, self.idol, self.fan, self.stranger])
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('relationships'), {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flags = response.data['relationships']
+        self.assertEqual(flags[str(self.friend.pk)], {'following': True, 'followed_by': True, 'mutual': True})
+        self.assertEqual(flags[str(self.idol.pk)], {'following': True, 'followed_by': False, 'mutual': False})
+        self.assertEqual(flags[str(self.fan.pk)], {'following': False, 'followed_by': True, 'mutual': False})
+        self.assertEqual(flags[str(self.stranger.pk)], {'following': False, 'followed_by': False, 'mutual': False})
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse('relationships'), {'ids': ids})
+
+    def test_follow_drops_the_cached_following_set(self):
+        self.client.get(reverse('relationships'), {'ids': str(self.fan.pk)})
+        self.assertIsNotNone(cache.get(following_cache_key(self.viewer.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('follow_user', args=[self.fan.pk]))
+        response = self.client.get(reverse('relationships'), {'ids': str(self.fan.pk)})
+        self.assertTrue(response.data['relationships'][str(self.fan.pk)]['mutual'])
+
+    def test_lookup_rejects_bad_ids(self):
+        response = self.client.get(reverse('relationships'), {'ids': 'a,b'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('relationships'), {'ids': ','.join(['1'] * 301)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_lists_render_relationships_without_per_row_queries(self):
+        url = reverse('user_followers', args=[self.viewer.pk])
+        # Page, then one "you follow" and one "follows you" query for the whole page
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        flags = {row['username']: row['relationship'] for row in response.data['results']}
+        self.assertEqual(flags['friend']['mutual'], True)
+        self.assertEqual(flags['fan'], {'following': False, 'followed_by': True, 'mutual': False})
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', password='password')
+        bob = CustomUser.objects.create_user(username='bob', password='password')
+        self.posts = [Post.objects.create(author=self.alice, title=f'Post {i}', content='Hello') for i in range(3)]
+        others = Post.objects.create(author=bob, title='Not hers', content='Hello')
+        Comment.objects.create(post=others, author=self.alice, content='Nice')
+        Like.objects.create(user=self.alice, post=others)
+        Notification.objects.create(recipient=self.alice, actor=bob, verb='liked your post', target=self.posts[0])
+
+    def _lines(self, body):
+        return [json.loads(line) for line in gzip.decompress(body).splitlines()]
+
+    def test_export_streams_gzipped_ndjson_of_the_users_rows(self):
+        self.client.force_authenticate(user=self.alice)
+        response = self.client.get(reverse('export_data'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('filename="alice-export.ndjson.gz"', response['Content-Disposition'])
+        lines = self._lines(b''.join(response.streaming_content))
+        self.assertEqual([line['type'] for line in lines], ['post'] * 3 + ['comment', 'like', 'notification'])
+        self.assertEqual([line['data']['id'] for line in lines[:3]], [post.pk for post in self.posts])
+        self.assertEqual(lines[3]['data']['content'], 'Nice')
+        self.assertEqual(lines[5]['data']['target_type'], 'post')
+
+    def test_export_requires_authentication(self):
+        self.assertEqual(self.client.get(reverse('export_data')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_the_same_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'alice.ndjson.gz')
+            call_command('export_user_data', 'alice', output=path, chunk_size=1, stdout=StringIO())
+            with open(path, 'rb') as export:
+                lines = self._lines(export.read())
+        self.assertEqual(len(lines), 6)
@@ -1,9 +1,16 @@
 from django.urls import path
-from .views import RegisterView, LoginView
+from . import views
+from .views import RegisterView, LoginView, UserProfileView, FollowersView, FollowingView, FollowSuggestionsView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('users/<int:pk>/', UserProfileView.as_view(), name='user_profile'),
+    path('users/<int:pk>/followers/', FollowersView.as_view(), name='user_followers'),
+    path('users/<int:pk>/following/', FollowingView.as_view(), name='user_following'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow_suggestions'),
+    path('relationships/', views.relationships, name='relationships'),
+    path('export/', views.export_data, name='export_data'),
     path('follow/<int:user_id>/', views.follow_user, name='follow_user'),
     path('unfollow/<int:user_id>/', views.unfollow_user, name='unfollow_user'),
 ]
@@ -3,16 +3,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
-from .models import CustomUser
-from .serializers import UserSerializer
+from .export import export_user_data
+from .models import CustomUser, Follow, FollowSuggestion
+from .relationships import lookup_relationships
+from .serializers import (UserSerializer, UserProfileSerializer, FollowEdgeSerializer, FollowSuggestionSerializer,
+                          RelationshipLookupSerializer)
 from rest_framework.permissions import IsAuthenticated
+from rest_framework import generics
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from .models import CustomUser
-ss=generics.GenericAPIView, 
-sz=permissions.IsAuthenticated.CustomUser.objects.all()
+from social_media_api.pagination import KeysetCursorPagination
+from rest_framework.decorators import api_view, permission_classes
 class RegisterView(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
@@ -28,17 +30,81 @@ class LoginView(ObtainAuthToken):
         return Response({'token': token.key})
 
 
+class UserProfileView(generics.RetrieveAPIView):
+    queryset = CustomUser.objects.all()
+    serializer_class = UserProfileSerializer
+
+
+class FollowersView(generics.ListAPIView):
+    # Who follows the user, newest first
+    serializer_class = FollowEdgeSerializer
+    pagination_class = KeysetCursorPagination
+    edge_user = 'follower'
+
+    def get_queryset(self):
+        return Follow.objects.filter(followee_id=self.kwargs['pk']).select_related(self.edge_user)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'edge_user': self.edge_user}
+
+
+class FollowingView(FollowersView):
+    # Who the user follows, newest first
+    edge_user = 'followee'
+
+    def get_queryset(self):
+        return Follow.objects.filter(follower_id=self.kwargs['pk']).select_related(self.edge_user)
+
+
+class FollowSuggestionsView(generics.ListAPIView):
+    # Precomputed by build_follow_suggestions; accounts followed since then are skipped
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        followed = Follow.objects.filter(follower=self.request.user).values('followee_id')
+        return (FollowSuggestion.objects.filter(user=self.request.user)
+                .exclude(suggested_id__in=followed)
+                .select_related('suggested')
+                .order_by('-mutual_count', 'suggested_id'))
+
 
 @api_view(['POST'])
+@permission_classes([IsAuthenticated])
 def follow_user(request, user_id):
     user_to_follow = get_object_or_404(CustomUser, id=user_id)
     if request.user != user_to_follow:
-        request.user.following.add(user_to_follow)
+        # Counters, feeds and suggestions follow the new edge through accounts.signals.followed
+        with transaction.atomic():
+            Follow.objects.get_or_create(follower=request.user, followee=user_to_follow)
         return Response({"message": "Followed successfully"}, status=status.HTTP_200_OK)
     return Response({"message": "You cannot follow yourself"}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@permission_classes([IsAuthenticated])
 def unfollow_user(request, user_id):
     user_to_unfollow = get_object_or_404(CustomUser, id=user_id)
-    request.user.following.remove(user_to_unfollow)
+    with transaction.atomic():
+        Follow.objects.filter(follower=request.user, followee=user_to_unfollow).delete()
     return Response({"message": "Unfollowed successfully"}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def relationships(request):
+    """Relationship flags between the requesting user and ``?ids=1,2,3``."""
+    ids = [user_id for user_id in request.query_params.get('ids', '').split(',') if user_id]
+    serializer = RelationshipLookupSerializer(data={'ids': ids})
+    serializer.is_valid(raise_exception=True)
+    flags = lookup_relationships(request.user.pk, serializer.validated_data['ids'])
+    return Response({'relationships': {str(user_id): flags[user_id] for user_id in sorted(flags)}})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_data(request):
+    """The requesting user's posts, comments, likes and notifications as a streamed .ndjson.gz file."""
+    # A gzip file rather than Content-Encoding: clients get the same bytes whatever they accept
+    response = StreamingHttpResponse(export_user_data(request.user), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="{request.user.username}-export.ndjson.gz"'
+    return response
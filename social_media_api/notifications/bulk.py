@@ -0,0 +1,48 @@
+"""
+Set-based inbox maintenance.
+
+Each operation walks the matching notifications in chunks of
+NOTIFICATION_BULK_CHUNK_SIZE ids and issues one UPDATE or DELETE per chunk in
+its own short transaction, so a huge inbox never holds a long lock, and the
+unread counter is adjusted in the same transaction as each chunk.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .unread import adjust_unread, count_deltas
+
+BULK_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_BULK_CHUNK_SIZE', 1000)
+
+
+def _chunks(queryset, chunk_size):
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        last_id = ids[-1]
+        yield ids
+
+
+def mark_read(queryset, chunk_size=BULK_CHUNK_SIZE):
+    """Mark the unread notifications in ``queryset`` read; returns how many changed."""
+    queryset = queryset.filter(read=False)
+    updated = 0
+    for ids in _chunks(queryset, chunk_size):
+        with transaction.atomic():
+            # Lock the chunk so the counter change matches exactly the rows updated
+            recipients = list(queryset.filter(id__in=ids).select_for_update().values_list('recipient_id', flat=True))
+            count = queryset.filter(id__in=ids).update(read=True)
+            adjust_unread(count_deltas(recipients, sign=-1))
+        updated += count
+    return updated
+
+
+def delete_read(queryset, chunk_size=BULK_CHUNK_SIZE):
+    """Delete the read notifications in ``queryset``; returns how many were removed."""
+    queryset = queryset.filter(read=True)
+    deleted = 0
+    for ids in _chunks(queryset, chunk_size):
+        count, _ = queryset.filter(id__in=ids).delete()
+        deleted += count
+    return deleted
@@ -0,0 +1,47 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from notifications.outbox import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+def _worker(batch_size, idle_sleep, once):
+    # Each process opens its own database connection on first use
+    drained = 0
+    while True:
+        count = drain_outbox(batch_size)
+        drained += count
+        if count < batch_size:
+            if once:
+                return drained
+            time.sleep(idle_sleep)
+
+
+class Command(BaseCommand):
+    help = 'Move queued notifications from the outbox into the notifications table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+                            help='Outbox rows turned into notifications per transaction')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is empty')
+
+    def handle(self, *args, **options):
+        worker_args = (options['batch_size'], options['idle_sleep'], options['once'])
+        processes = options['processes']
+        if processes > 1 and not connection.features.has_select_for_update_skip_locked:
+            # Without SKIP LOCKED two workers could claim the same outbox rows
+            self.stderr.write(f'{connection.vendor} cannot claim rows with SKIP LOCKED; using one worker')
+            processes = 1
+        if processes == 1:
+            drained = _worker(*worker_args)
+        else:
+            # Connections must not be shared with forked children
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                drained = sum(pool.starmap(_worker, [worker_args] * processes))
+        self.stdout.write(self.style.SUCCESS(f'Created {drained} notifications'))
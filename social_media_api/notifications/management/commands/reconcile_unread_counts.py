@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from notifications.models import Notification, UnreadCounter
+from notifications.unread import unread_cache_key
+
+
+class Command(BaseCommand):
+    help = 'Recompute unread notification counters from the notifications table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of users recomputed per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipients = (Notification.objects.order_by('recipient_id')
+                      .values_list('recipient_id', flat=True).distinct())
+        user_ids = set(recipients) | set(UnreadCounter.objects.values_list('user_id', flat=True))
+        user_ids = sorted(user_ids)
+
+        repaired = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            actual = dict(
+                Notification.objects.filter(recipient_id__in=chunk)
+                .values('recipient_id')
+                .annotate(unread=Count('id', filter=Q(read=False)))
+                .values_list('recipient_id', 'unread')
+            )
+            stored = dict(UnreadCounter.objects.filter(user_id__in=chunk).values_list('user_id', 'count'))
+            for user_id in chunk:
+                if stored.get(user_id) != actual.get(user_id, 0):
+                    UnreadCounter.objects.update_or_create(user_id=user_id, defaults={'count': actual.get(user_id, 0)})
+                    cache.delete(unread_cache_key(user_id))
+                    repaired += 1
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} unread counters'))
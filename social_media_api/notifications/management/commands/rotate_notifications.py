@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notifications.bulk import mark_read
+from notifications.models import Notification
+from notifications.partitions import add_months, archive_before, drop_archived_before, ensure_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = ('Mark notifications older than the inbox window read, create upcoming notification partitions, '
+            'archive old months and drop expired archives')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inbox-days', type=int, default=getattr(settings, 'NOTIFICATION_INBOX_DAYS', 90),
+                            help='Notifications older than this leave the inbox and the unread count')
+        parser.add_argument('--archive-after-months', type=int,
+                            default=getattr(settings, 'NOTIFICATION_ARCHIVE_AFTER_MONTHS', 6),
+                            help='Months kept in the live table before being archived')
+        parser.add_argument('--drop-after-months', type=int,
+                            default=getattr(settings, 'NOTIFICATION_DROP_AFTER_MONTHS', 24),
+                            help='Months after which archived notifications are dropped')
+        parser.add_argument('--premake-months', type=int, default=3,
+                            help='Future monthly partitions to create ahead of time (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['drop_after_months'] < options['archive_after_months']:
+            raise CommandError('--drop-after-months must not be lower than --archive-after-months')
+
+        # The inbox only lists the last --inbox-days days; the badge must not count what it cannot show
+        expired = mark_read(Notification.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=options['inbox_days'])))
+        if expired:
+            self.stdout.write(f'Marked {expired} notifications outside the inbox window read')
+
+        this_month = month_start(timezone.now())
+        for name in ensure_partitions(add_months(this_month, options['premake_months'])):
+            self.stdout.write(f'Created {name}')
+        for name in archive_before(add_months(this_month, -options['archive_after_months'])):
+            self.stdout.write(f'Archived {name}')
+        for name in drop_archived_before(add_months(this_month, -options['drop_after_months'])):
+            self.stdout.write(f'Dropped {name}')
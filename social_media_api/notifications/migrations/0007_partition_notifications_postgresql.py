@@ -0,0 +1,119 @@
+"""
+Turn notifications_notification into a table partitioned by month on
+created_at. Only PostgreSQL supports declarative partitioning; on other
+databases this migration does nothing and rotate_notifications falls back to
+archive tables (see notifications.partitions).
+
+Indexes and constraints are recreated from the catalog definitions of the
+old table, so they keep the names Django gave them. Both directions were run
+against PostgreSQL 16 with rows spread over several months.
+"""
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+TABLE = 'notifications_notification'
+LEGACY = 'notifications_notification_unpartitioned'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _definitions(cursor, table):
+    """
+    ``(name, SQL)`` recreating the indexes and the foreign key and unique
+    constraints of ``table`` on TABLE under their current names. The primary
+    key is left out (it changes with partitioning), as are CHECK constraints,
+    which CREATE TABLE ... LIKE copies.
+    """
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('f', 'u') ORDER BY conname",
+        [table],
+    )
+    constraints = [(name, f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+                   for name, definition in cursor.fetchall()]
+    cursor.execute(
+        "SELECT index.relname, pg_get_indexdef(index.oid) FROM pg_index "
+        "JOIN pg_class index ON index.oid = pg_index.indexrelid "
+        "WHERE pg_index.indrelid = %s::regclass AND NOT pg_index.indisprimary "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE pg_constraint.conindid = pg_index.indexrelid) "
+        "ORDER BY index.relname",
+        [table],
+    )
+    indexes = [
+        # Indexes of a partitioned table read "ON ONLY"; they are rebuilt on the whole table
+        (name, definition.replace(' ON ONLY ', ' ON ').replace(f'public.{table} ', f'public."{TABLE}" '))
+        for name, definition in cursor.fetchall()
+    ]
+    return indexes + constraints
+
+
+def _swap_table(cursor, partitioned):
+    cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+    cursor.execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+        f'INCLUDING IDENTITY INCLUDING STORAGE)' + (' PARTITION BY RANGE (created_at)' if partitioned else '')
+    )
+
+
+def _copy_rows(cursor, partitioned):
+    cursor.execute(f'INSERT INTO "{TABLE}" OVERRIDING SYSTEM VALUE SELECT * FROM "{LEGACY}"')
+    definitions = _definitions(cursor, LEGACY)
+    # No CASCADE: a foreign key from another table would be lost silently
+    cursor.execute(f'DROP TABLE "{LEGACY}"')
+    # The primary key of a partitioned table must contain the partition key
+    cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY '
+                   + ('(id, created_at)' if partitioned else '(id)'))
+    for _, sql in definitions:
+        cursor.execute(sql)
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM \"{TABLE}\""
+    )
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        _swap_table(cursor, partitioned=True)
+
+        cursor.execute(f'SELECT MIN(created_at) FROM "{LEGACY}"')
+        oldest = cursor.fetchone()[0] or datetime.now(timezone.utc)
+        month = datetime(oldest.year, oldest.month, 1, tzinfo=timezone.utc)
+        # Existing months plus three months ahead; rotate_notifications keeps creating new ones
+        last = _add_months(datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0), 3)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_p{month.year}{month.month:02d}" PARTITION OF "{TABLE}" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, _add_months(month, 1)],
+            )
+            month = _add_months(month, 1)
+        # Catches rows written past the newest partition until it is created
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        _copy_rows(cursor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        _swap_table(cursor, partitioned=False)
+        _copy_rows(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    atomic = True
+
+    dependencies = [
+        ('notifications', '0006_partition_by_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
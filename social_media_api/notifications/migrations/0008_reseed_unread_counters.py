@@ -0,0 +1,40 @@
+"""
+Recompute every unread counter from the notifications table.
+
+Before adjust_unread seeded missing rows, the first notification change of a
+user who had never polled created their counter at 0, so it undercounted the
+notifications they already had. Same computation as reconcile_unread_counts.
+"""
+from django.db import migrations
+from django.db.models import Count, Q
+
+CHUNK_SIZE = 1000
+
+
+def reseed(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    UnreadCounter = apps.get_model('notifications', 'UnreadCounter')
+    user_ids = sorted(UnreadCounter.objects.values_list('user_id', flat=True))
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        unread = dict(
+            Notification.objects.filter(recipient_id__in=chunk)
+            .values('recipient_id')
+            .annotate(unread=Count('id', filter=Q(read=False)))
+            .values_list('recipient_id', 'unread')
+        )
+        counters = list(UnreadCounter.objects.filter(user_id__in=chunk))
+        for counter in counters:
+            counter.count = unread.get(counter.user_id, 0)
+        UnreadCounter.objects.bulk_update(counters, ['count'], batch_size=CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_partition_notifications_postgresql'),
+    ]
+
+    operations = [
+        migrations.RunPython(reseed, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -12,8 +13,47 @@ class Notification(models.Model):
     target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     target_object_id = models.PositiveIntegerField()
     target = GenericForeignKey('target_content_type', 'target_object_id')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Set from the outbox row, not at drain time
+    # Never changes once written; the table is partitioned by month on this column
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
     read = models.BooleanField(default=False)
+    # Aggregation: one row stands for every actor that did ``verb`` to ``target``
+    # for this recipient within the same NOTIFICATION_AGGREGATION_WINDOW
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_sample = models.JSONField(default=list, blank=True)  # Most recent actor ids, newest first
+    aggregation_bucket = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves the inbox query: one recipient, newest first, keyset paginated
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_ts_idx'),
+        ]
+        constraints = [
+            # created_at is derived from the bucket for aggregated rows; it is part of
+            # the key because unique constraints on a partitioned table must include it
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'target_content_type', 'target_object_id', 'aggregation_bucket',
+                        'created_at'],
+                name='notif_aggregation_unique',
+            ),
+        ]
 
     def __str__(self):
         return f'Notification for {self.recipient} - {self.verb}'
+
+
+class NotificationOutbox(models.Model):
+    # Pending notification written in the request transaction and turned into
+    # a Notification by the drain_notifications workers
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    target_object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+class UnreadCounter(models.Model):
+    # Unread notifications per user, kept in step by notifications.unread
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    count = models.IntegerField(default=0)
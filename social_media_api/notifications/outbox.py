@@ -0,0 +1,143 @@
+"""
+Transactional outbox for notifications.
+
+Request handlers call ``enqueue`` inside their own transaction, which costs a
+single INSERT into NotificationOutbox. The drain_notifications workers (or
+``drain_outbox`` called directly) move pending rows into Notification in
+batches, so notification work never runs on the request path.
+
+While draining, notifications with the same recipient, verb and target in the
+same NOTIFICATION_AGGREGATION_WINDOW are folded into a single row that keeps
+an actor count and a small sample of actor ids.
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from .models import Notification, NotificationOutbox
+from .unread import adjust_unread, count_deltas
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 500)
+AGGREGATION_WINDOW = getattr(settings, 'NOTIFICATION_AGGREGATION_WINDOW', 3600)
+ACTOR_SAMPLE_SIZE = getattr(settings, 'NOTIFICATION_ACTOR_SAMPLE_SIZE', 3)
+
+
+def _outbox_row(recipient_id, actor_id, verb, target):
+    # ContentType lookups are cached per process, so this adds no query after the first call
+    return NotificationOutbox(
+        recipient_id=recipient_id,
+        actor_id=actor_id,
+        verb=verb,
+        target_content_type=ContentType.objects.get_for_model(target),
+        target_object_id=target.pk,
+    )
+
+
+def enqueue(recipient_id, actor_id, verb, target):
+    """Queue one notification; call inside the transaction of the change it reports."""
+    _outbox_row(recipient_id, actor_id, verb, target).save()
+
+
+def enqueue_many(notifications):
+    """Queue ``(recipient_id, actor_id, verb, target)`` tuples with one INSERT."""
+    NotificationOutbox.objects.bulk_create([_outbox_row(*notification) for notification in notifications])
+
+
+def _aggregation_key(row):
+    bucket = int(row.created_at.timestamp() // AGGREGATION_WINDOW)
+    return (row.recipient_id, row.verb, row.target_content_type_id, row.target_object_id, bucket)
+
+
+def _group_rows(rows):
+    """Fold outbox rows sharing an aggregation key; each group keeps its rows oldest first."""
+    groups = OrderedDict()
+    for row in rows:
+        groups.setdefault(_aggregation_key(row), []).append(row)
+    return groups
+
+
+def _merge_actors(sample, rows):
+    """
+    Return ``sample`` with the actors of ``rows`` in front, newest first, and
+    how many of them were not already in it. Only the sample is checked for
+    repeats, so an actor who dropped out of it is counted again.
+    """
+    new_actors = []
+    for row in reversed(rows):
+        if row.actor_id not in new_actors and row.actor_id not in sample:
+            new_actors.append(row.actor_id)
+    return (new_actors + sample)[:ACTOR_SAMPLE_SIZE], len(new_actors)
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Turn up to ``batch_size`` pending outbox rows into notifications.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the database
+    supports it, so several workers can drain concurrently without handing
+    out the same row twice. Aggregate rows are created with
+    ``ignore_conflicts`` against a unique constraint on the aggregation key
+    and then locked before their counts are bumped, so two workers folding
+    likes into the same notification never lose an update.
+
+    Returns the number of outbox rows consumed.
+    """
+    with transaction.atomic():
+        pending = NotificationOutbox.objects.order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        rows = list(pending[:batch_size])
+        if not rows:
+            return 0
+
+        groups = _group_rows(rows)
+        Notification.objects.bulk_create([
+            Notification(
+                recipient_id=recipient_id,
+                actor_id=group[-1].actor_id,
+                verb=verb,
+                target_content_type_id=content_type_id,
+                target_object_id=object_id,
+                timestamp=group[-1].created_at,
+                # Derived from the bucket so concurrent workers produce the same key
+                created_at=datetime.fromtimestamp(bucket * AGGREGATION_WINDOW, tz=timezone.utc),
+                actor_count=0,
+                aggregation_bucket=bucket,
+            )
+            for (recipient_id, verb, content_type_id, object_id, bucket), group in groups.items()
+        ], ignore_conflicts=True)
+
+        # Superset of the aggregate rows for this batch, narrowed by key below
+        candidates = Notification.objects.select_for_update().filter(
+            recipient_id__in={key[0] for key in groups},
+            target_object_id__in={key[3] for key in groups},
+            aggregation_bucket__in={key[4] for key in groups},
+        )
+        notifications = {}
+        for notification in candidates:
+            key = (notification.recipient_id, notification.verb, notification.target_content_type_id,
+                   notification.target_object_id, notification.aggregation_bucket)
+            if key in groups:
+                notifications[key] = notification
+
+        became_unread = []
+        for key, group in groups.items():
+            notification = notifications[key]
+            was_unread = notification.actor_count > 0 and not notification.read
+            notification.actor_sample, new_actors = _merge_actors(notification.actor_sample, group)
+            notification.actor_count += new_actors
+            notification.actor_id = group[-1].actor_id
+            notification.timestamp = max(notification.timestamp, group[-1].created_at)
+            if new_actors:
+                notification.read = False
+            if not was_unread and not notification.read:
+                became_unread.append(notification.recipient_id)
+        Notification.objects.bulk_update(
+            notifications.values(), ['actor_sample', 'actor_count', 'actor_id', 'timestamp', 'read'],
+        )
+        NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+        adjust_unread(count_deltas(became_unread))
+    return len(rows)
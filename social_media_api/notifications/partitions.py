@@ -0,0 +1,197 @@
+"""
+Monthly storage rotation for the notifications table.
+
+On PostgreSQL ``notifications_notification`` is a table partitioned by month
+on ``created_at`` (see migration 0007). Each month lives in its own partition
+named ``notifications_notification_pYYYYMM``; archiving a month detaches its
+partition and retention drops the detached table, so old data leaves the
+inbox without a single row-level DELETE. Rows written past the newest
+partition land in the DEFAULT partition and are moved into their month's
+partition when ``ensure_partitions`` creates it.
+
+SQLite has no partitioning, so the same layout is emulated by rotation: an
+archived month is copied into a ``notifications_notification_pYYYYMM`` table
+with one INSERT ... SELECT and removed from the live table with one range
+DELETE on the indexed ``created_at`` column. PostgreSQL rows that landed in
+the DEFAULT partition (months without a partition of their own) are archived
+the same way.
+
+Archived notifications leave the unread counters: each month is taken out in
+a transaction that also subtracts its unread notifications per recipient.
+Dropping an archive changes no counter, since its rows were already
+subtracted when it was archived.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Notification
+from .unread import adjust_unread
+
+TABLE = 'notifications_notification'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year}{month.month:02d}'
+
+
+def _month_from_name(name):
+    match = PARTITION_RE.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+
+
+def _db_value(value):
+    # Raw SQL needs the same datetime format the ORM stores (naive UTC text on SQLite)
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def attached_partitions():
+    """``{month: table name}`` of the partitions currently serving the live table."""
+    if not is_partitioned():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'WHERE parent.relname = %s',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return {month: name for name in names if (month := _month_from_name(name))}
+
+
+def archived_tables():
+    """``{month: table name}`` of the archived months that are no longer served."""
+    attached = set(attached_partitions().values())
+    with connection.cursor() as cursor:
+        names = connection.introspection.table_names(cursor)
+    return {
+        month: name for name in names
+        if (month := _month_from_name(name)) and name not in attached
+    }
+
+
+def _create_partition(cursor, month):
+    name = partition_name(month)
+    bounds = [_db_value(month), _db_value(add_months(month, 1))]
+    cursor.execute(f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s LIMIT 1', bounds)
+    if cursor.fetchone() is None:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                       bounds)
+        return
+    # PostgreSQL refuses a partition whose range the DEFAULT partition holds rows of, so those
+    # rows are moved into it while DEFAULT is detached
+    with transaction.atomic():
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)', bounds)
+        cursor.execute(
+            f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s',
+            bounds,
+        )
+        cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s', bounds)
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+
+
+def ensure_partitions(until):
+    """Create the monthly partitions from the current month up to ``until`` (PostgreSQL only)."""
+    if not is_partitioned():
+        return []
+    created = []
+    month = month_start(datetime.now(dt_timezone.utc))
+    attached = attached_partitions()
+    with connection.cursor() as cursor:
+        while month <= until:
+            if month not in attached:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+def _unread_by_recipient(notifications):
+    return dict(
+        notifications.filter(read=False).values('recipient_id').annotate(unread=Count('id'))
+        .values_list('recipient_id', 'unread')
+    )
+
+
+def _subtract_unread(unread):
+    # After the rows left the live table, as adjust_unread expects
+    adjust_unread({recipient_id: -count for recipient_id, count in unread.items()})
+
+
+def _move_month(month):
+    """Move the rows of ``month`` still in the live table into its archive table; returns how many moved."""
+    name = partition_name(month)
+    bounds = [_db_value(month), _db_value(add_months(month, 1))]
+    with transaction.atomic(), connection.cursor() as cursor:
+        unread = _unread_by_recipient(Notification.objects.filter(
+            created_at__gte=month, created_at__lt=add_months(month, 1)))
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" AS SELECT * FROM "{TABLE}" WHERE 1 = 0')
+        cursor.execute(
+            f'INSERT INTO "{name}" SELECT * FROM "{TABLE}" WHERE created_at >= %s AND created_at < %s', bounds,
+        )
+        moved = cursor.rowcount
+        if moved:
+            cursor.execute(f'DELETE FROM "{TABLE}" WHERE created_at >= %s AND created_at < %s', bounds)
+            _subtract_unread(unread)
+    return moved
+
+
+def archive_before(cutoff):
+    """Take every month that ends on or before ``cutoff`` out of the live table."""
+    cutoff = month_start(cutoff)
+    archived = []
+    if is_partitioned():
+        for month, name in sorted(attached_partitions().items()):
+            if add_months(month, 1) <= cutoff:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    unread = _unread_by_recipient(Notification.objects.filter(
+                        created_at__gte=month, created_at__lt=add_months(month, 1)))
+                    cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                    _subtract_unread(unread)
+                archived.append(name)
+    # Whatever is still older than the cutoff has no partition (SQLite, or the DEFAULT partition)
+
+    oldest = Notification.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list(
+        'created_at', flat=True).first()
+    if oldest is None:
+        return archived
+    month = month_start(oldest)
+    while month < cutoff:
+        if _move_month(month):
+            archived.append(partition_name(month))
+        month = add_months(month, 1)
+    return archived
+
+
+def drop_archived_before(cutoff):
+    """Drop archived months that end on or before ``cutoff``."""
+    cutoff = month_start(cutoff)
+    dropped = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(archived_tables().items()):
+            if add_months(month, 1) <= cutoff:
+                cursor.execute(f'DROP TABLE "{name}"')
+                dropped.append(name)
+    return dropped
@@ -0,0 +1,47 @@
+"""
+Batched resolution of ``Notification.target``.
+
+``target`` is a GenericForeignKey, so serialising a page naively costs one
+query per notification. ``prefetch_targets`` groups a page by content type,
+loads every type's targets with one query (joining whatever the target's
+``__str__`` needs) and stores them in the GenericForeignKey cache, so the
+serializer never goes back to the database.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+from .models import Notification
+
+# Relations read by the target's ``__str__``, joined when the targets are loaded
+TARGET_SELECT_RELATED = {
+    'posts.comment': ('author', 'post'),
+}
+
+
+def prefetch_targets(notifications):
+    notifications = list(notifications)
+    target_field = Notification._meta.get_field('target')
+
+    ids_by_type = defaultdict(set)
+    for notification in notifications:
+        if not target_field.is_cached(notification):
+            ids_by_type[notification.target_content_type_id].add(notification.target_object_id)
+
+    targets = {}
+    for content_type_id, object_ids in ids_by_type.items():
+        content_type = ContentType.objects.get_for_id(content_type_id)
+        model = content_type.model_class()
+        queryset = model._base_manager.filter(pk__in=object_ids)
+        select_related = TARGET_SELECT_RELATED.get(model._meta.label_lower)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        for target in queryset:
+            targets[content_type_id, target.pk] = target
+
+    for notification in notifications:
+        if not target_field.is_cached(notification):
+            key = (notification.target_content_type_id, notification.target_object_id)
+            # Deleted targets are cached as None so they are not looked up again
+            target_field.set_cached_value(notification, targets.get(key))
+    return notifications
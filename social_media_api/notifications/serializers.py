@@ -1,7 +1,56 @@
 from rest_framework import serializers
 from .models import Notification
 
+class GenericTargetField(serializers.Field):
+    # Read-only view of a GenericForeignKey: what the target is, its id and its label
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, notification):
+        target = notification.target
+        return {
+            'type': target._meta.model_name if target is not None else None,
+            'id': notification.target_object_id,
+            'display': str(target) if target is not None else None,
+        }
+
+
 class NotificationSerializer(serializers.ModelSerializer):
+    target = GenericTargetField()  # Resolved in batches by notifications.prefetch
+
     class Meta:
         model = Notification
-        fields = ['recipient', 'actor', 'verb', 'target', 'timestamp', 'read']
+        fields = ['recipient', 'actor', 'verb', 'target', 'timestamp', 'read', 'actor_count', 'actor_sample',
+                  'target_content_type', 'target_object_id']
+        read_only_fields = ['actor_count', 'actor_sample']
+        # What ``target`` shows is written through its two columns
+        extra_kwargs = {'target_content_type': {'write_only': True}, 'target_object_id': {'write_only': True}}
+
+
+class NotificationExportSerializer(serializers.ModelSerializer):
+    # Flat, so it compiles for the data export; the target is not resolved
+    target_type = serializers.ReadOnlyField(source='target_content_type.model')
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'actor', 'verb', 'target_type', 'target_object_id', 'timestamp', 'read', 'actor_count',
+                  'actor_sample']
+
+
+class MarkReadSerializer(serializers.Serializer):
+    # Either every notification up to and including ``until``, or the listed ids
+    until = serializers.DateTimeField(required=False)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=1000)
+
+    def validate(self, attrs):
+        if ('until' in attrs) == ('ids' in attrs):
+            raise serializers.ValidationError('Provide exactly one of "until" or "ids".')
+        return attrs
+
+
+class DeleteReadSerializer(serializers.Serializer):
+    older_than_days = serializers.IntegerField(min_value=0)
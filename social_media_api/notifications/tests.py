@@ -1,3 +1,320 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from posts.models import Post, Comment
+from social_media_api.pagination import TimestampCursorPagination
+from .models import Notification, NotificationOutbox, UnreadCounter
+from .bulk import mark_read
+from .outbox import drain_outbox, enqueue
+from .partitions import (
+    add_months, archive_before, archived_tables, attached_partitions, ensure_partitions, is_partitioned,
+    month_start, partition_name,
+)
+from .prefetch import prefetch_targets
+from .serializers import NotificationSerializer
+
+User = get_user_model()
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.reader = User.objects.create_user(username='reader', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.client.force_authenticate(user=self.reader)
+
+    def test_like_only_writes_the_outbox(self):
+        response = self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_drain_creates_notifications_in_batches(self):
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        queued_at = NotificationOutbox.objects.get().created_at
+        enqueue(self.reader.pk, self.author.pk, 'liked your post', self.post)
+        enqueue(self.author.pk, self.reader.pk, 'commented on your post', self.post)
+
+        self.assertEqual(drain_outbox(batch_size=2), 2)
+        call_command('drain_notifications', once=True, stdout=StringIO())
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+        notification = Notification.objects.get(recipient=self.author, verb='liked your post')
+        self.assertEqual(notification.timestamp, queued_at)
+        self.assertEqual(notification.target, self.post)
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class AggregationTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Popular', content='Post')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='password') for i in range(5)]
+
+    def like(self, fan, queued_at=None):
+        enqueue(self.author.pk, fan.pk, 'liked your post', self.post)
+        if queued_at:
+            NotificationOutbox.objects.filter(actor=fan).update(created_at=queued_at)
+
+    def test_likes_in_one_window_fold_into_one_notification(self):
+        for fan in self.fans[:3]:
+            self.like(fan)
+        drain_outbox(batch_size=2)
+        Notification.objects.update(read=True)
+        for fan in self.fans[3:]:
+            self.like(fan)
+        drain_outbox()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.actor_sample, [self.fans[4].pk, self.fans[3].pk, self.fans[2].pk])
+        self.assertEqual(notification.actor, self.fans[4])
+        self.assertFalse(notification.read)
+
+    def test_windows_and_targets_are_kept_apart(self):
+        now = timezone.now()
+        self.like(self.fans[0], now - timedelta(days=1))
+        self.like(self.fans[1], now)
+        other = Post.objects.create(author=self.author, title='Other', content='Post')
+        enqueue(self.author.pk, self.fans[2].pk, 'liked your post', other)
+        drain_outbox()
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class UnreadCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.fan = User.objects.create_user(username='fan', password='password')
+        self.posts = [Post.objects.create(author=self.author, title=str(i), content='Post') for i in range(3)]
+        for post in self.posts:
+            enqueue(self.author.pk, self.fan.pk, 'liked your post', post)
+        drain_outbox()
+        self.client.force_authenticate(user=self.author)
+        self.url = reverse('notification-unread-count')
+
+    def test_count_is_served_without_touching_notifications(self):
+        self.assertEqual(self.client.get(self.url).data['unread'], 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data['unread'], 3)
+
+    def test_count_follows_reads_and_new_notifications(self):
+        self.client.get(self.url)
+        notification = Notification.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('notification-detail', kwargs={'pk': notification.pk}), {'read': True})
+        self.assertEqual(self.client.get(self.url).data['unread'], 2)
+
+        # A new actor on a read notification makes it unread again
+        other = User.objects.create_user(username='other', password='password')
+        enqueue(self.author.pk, other.pk, 'liked your post', notification.target)
+        with self.captureOnCommitCallbacks(execute=True):
+            drain_outbox()
+        self.assertEqual(self.client.get(self.url).data['unread'], 3)
+
+    def test_count_follows_notifications_created_through_the_endpoint(self):
+        self.client.get(self.url)
+        data = {'recipient': self.author.pk, 'actor': self.fan.pk, 'verb': 'mentioned you',
+                'target_content_type': ContentType.objects.get_for_model(Post).pk,
+                'target_object_id': self.posts[0].pk}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notification-list'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('target_object_id', response.data)
+        self.assertEqual(self.client.get(self.url).data['unread'], 4)
+        self.assertEqual(UnreadCounter.objects.get(user=self.author).count, 4)
+
+    def test_first_change_seeds_the_counter_from_existing_notifications(self):
+        # The author has never polled, so there is no counter row yet
+        UnreadCounter.objects.filter(user=self.author).delete()
+        notification = Notification.objects.first()
+        self.client.patch(reverse('notification-detail', kwargs={'pk': notification.pk}), {'read': True})
+        self.assertEqual(UnreadCounter.objects.get(user=self.author).count, 2)
+        self.client.patch(reverse('notification-detail', kwargs={'pk': notification.pk}), {'read': True})
+        self.assertEqual(self.client.get(self.url).data['unread'], 2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       CACHE_SINGLE_PROCESS=False)
+    def test_process_local_caches_are_not_trusted_with_counts(self):
+        self.assertEqual(self.client.get(self.url).data['unread'], 3)
+        # Another worker's write is only in the row, never in this process's cache
+        UnreadCounter.objects.filter(user=self.author).update(count=2)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).data['unread'], 2)
+
+    def test_reconcile_repairs_drift(self):
+        UnreadCounter.objects.filter(user=self.author).update(count=42)
+        call_command('reconcile_unread_counts', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data['unread'], 3)
+
+
+class BulkActionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.fan = User.objects.create_user(username='fan', password='password')
+        for i in range(5):
+            post = Post.objects.create(author=self.author, title=str(i), content='Post')
+            enqueue(self.author.pk, self.fan.pk, 'liked your post', post)
+        drain_outbox()
+        self.notifications = list(Notification.objects.order_by('timestamp', 'id'))
+        self.client.force_authenticate(user=self.author)
+
+    def unread(self):
+        return self.client.get(reverse('notification-unread-count')).data['unread']
+
+    def test_mark_read_until_timestamp_in_chunks(self):
+        self.assertEqual(self.unread(), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notification-mark-read'),
+                                        {'until': self.notifications[2].timestamp.isoformat()}, format='json')
+        self.assertEqual(response.data['marked_read'], 3)
+        self.assertEqual(self.unread(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_read(Notification.objects.all(), chunk_size=1), 2)
+        self.assertEqual(self.unread(), 0)
+
+    def test_mark_read_ids_ignores_other_inboxes(self):
+        foreign = Notification.objects.create(recipient=self.fan, actor=self.author, verb='x',
+                                              target=self.notifications[0].target)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notification-mark-read'),
+                                        {'ids': [self.notifications[0].pk, foreign.pk]}, format='json')
+        self.assertEqual(response.data['marked_read'], 1)
+        self.assertEqual(self.unread(), 4)
+        self.assertFalse(Notification.objects.get(pk=foreign.pk).read)
+
+    def test_delete_read_older_than(self):
+        Notification.objects.filter(pk__in=[n.pk for n in self.notifications[:2]]).update(
+            read=True, timestamp=timezone.now() - timedelta(days=10))
+        response = self.client.post(reverse('notification-delete-read'), {'older_than_days': 7}, format='json')
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_requires_exactly_one_selector(self):
+        response = self.client.post(reverse('notification-mark-read'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RotationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Old', content='Post')
+        self.client.force_authenticate(user=self.author)
+
+    def notify(self, days_ago):
+        created = timezone.now() - timedelta(days=days_ago)
+        return Notification.objects.create(recipient=self.author, actor=self.author, verb='liked your post',
+                                           target=self.post, timestamp=created, created_at=created)
+
+    def test_inbox_reads_recent_notifications_unless_history_is_requested(self):
+        self.notify(1)
+        self.notify(200)
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get(reverse('notification-list'), {'history': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_rotation_keeps_the_unread_count_to_the_inbox(self):
+        self.notify(1)
+        self.notify(120)
+        self.notify(400)
+        unread_url = reverse('notification-unread-count')
+        self.assertEqual(self.client.get(unread_url).data['unread'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rotate_notifications', inbox_days=90, archive_after_months=6, stdout=StringIO())
+        self.assertEqual(self.client.get(unread_url).data['unread'], 1)
+        self.assertEqual(UnreadCounter.objects.get(user=self.author).count, 1)
+
+    def test_archiving_subtracts_unread_notifications(self):
+        self.notify(1)
+        self.notify(400)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rotate_notifications', inbox_days=1000, archive_after_months=6, stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 1)
+
+    def test_archiving_an_attached_month_subtracts_its_unread_notifications(self):
+        # On PostgreSQL the current month has its own partition, which is detached
+        self.notify(0)
+        self.client.get(reverse('notification-unread-count'))
+        this_month = month_start(timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_before(add_months(this_month, 1))
+        self.assertFalse(Notification.objects.exists())
+        self.assertIn(this_month, archived_tables())
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 0)
+
+    def test_rotation_archives_then_drops_whole_months(self):
+        self.notify(1)
+        self.notify(400)
+        old_month = month_start(timezone.now() - timedelta(days=400))
+
+        call_command('rotate_notifications', archive_after_months=6, drop_after_months=24, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertIn(old_month, archived_tables())
+
+        call_command('rotate_notifications', archive_after_months=6, drop_after_months=6, stdout=StringIO())
+        self.assertNotIn(old_month, archived_tables())
+
+    @skipUnless(is_partitioned(), 'Only PostgreSQL partitions the live table')
+    def test_new_partition_takes_its_rows_from_the_default_partition(self):
+        far_month = add_months(month_start(timezone.now()), 8)
+        notification = self.notify(-(far_month - timezone.now()).days - 2)  # Lands in the DEFAULT partition
+        created = ensure_partitions(far_month)
+        self.assertIn(partition_name(far_month), created)
+        self.assertIn(far_month, attached_partitions())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{partition_name(far_month)}"')
+            self.assertEqual(cursor.fetchall(), [(notification.id,)])
+        self.assertEqual(Notification.objects.get().id, notification.id)
+
+
+class TargetPrefetchTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.fan = User.objects.create_user(username='fan', password='password')
+        notifications = []
+        for i in range(25):
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='Post')
+            comment = Comment.objects.create(post=post, author=self.fan, content='Nice')
+            notifications.append(Notification(recipient=self.author, actor=self.fan, verb='liked your post',
+                                              target=post))
+            notifications.append(Notification(recipient=self.author, actor=self.fan, verb='commented',
+                                              target=comment))
+        Notification.objects.bulk_create(notifications)
+        self.client.force_authenticate(user=self.author)
+
+    @mock.patch.object(TimestampCursorPagination, 'page_size', 50)
+    def test_page_of_mixed_targets_costs_constant_queries(self):
+        ContentType.objects.clear_cache()
+        # Page, one query per target type, and the content type lookups
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('notification-list'))
+        self.assertEqual(len(response.data['results']), 50)
+        comment = next(item['target'] for item in response.data['results'] if item['verb'] == 'commented')
+        self.assertEqual(comment['type'], 'comment')
+        self.assertTrue(comment['display'].startswith('Comment by fan on Post'))
+
+    def test_deleted_targets_render_as_empty(self):
+        Post.objects.filter(title='Post 0').delete()
+        notification = Notification.objects.create(recipient=self.author, actor=self.fan, verb='liked your post',
+                                                   target_content_type=ContentType.objects.get_for_model(Post),
+                                                   target_object_id=999999)
+        prefetch_targets([notification])
+        self.assertIsNone(NotificationSerializer(notification).data['target']['type'])
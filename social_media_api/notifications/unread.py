@@ -0,0 +1,81 @@
+"""
+Unread notification counters.
+
+Badge polls read a per-user count from the cache, falling back to the
+UnreadCounter row, so they never touch the notifications table. Writers call
+``adjust_unread`` in the transaction that creates or reads notifications, after
+the change; the row is updated with an F() expression and a cached value is
+adjusted in place. A user without a row yet is seeded from the notifications
+table first, so counts from before the counters existed are not lost. On a
+process-local cache (see social_media_api.caching) other workers would keep
+their own stale copy, so polls read the row every time.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from social_media_api.caching import cache_is_shared
+from .models import Notification, UnreadCounter
+
+UNREAD_CACHE_TIMEOUT = getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TIMEOUT', 60)
+
+
+def unread_cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def adjust_unread(deltas):
+    """Apply a ``{user_id: delta}`` mapping to the unread counters."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    existing = set(UnreadCounter.objects.filter(user_id__in=deltas).values_list('user_id', flat=True))
+    missing = [user_id for user_id in deltas if user_id not in existing]
+    if missing:
+        unread = dict(
+            Notification.objects.filter(recipient_id__in=missing, read=False)
+            .values('recipient_id').annotate(unread=Count('id')).values_list('recipient_id', 'unread')
+        )
+        # The table already includes this change; seed the count from before it so that the
+        # delta below applies to every row alike, including a row a concurrent writer seeded first
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=user_id, count=unread.get(user_id, 0) - deltas[user_id]) for user_id in missing],
+            ignore_conflicts=True,
+        )
+    # One UPDATE per distinct delta; nearly every batch only has +1 or -1
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        UnreadCounter.objects.filter(user_id__in=user_ids).update(count=F('count') + delta)
+
+    def update_cache():
+        for user_id, delta in deltas.items():
+            try:
+                cache.incr(unread_cache_key(user_id), delta)
+            except ValueError:
+                pass  # Not cached; the next read loads the row
+    transaction.on_commit(update_cache)
+
+
+def count_deltas(user_ids, sign=1):
+    """``{user_id: sign * occurrences}`` for an iterable of recipient ids."""
+    return {user_id: sign * total for user_id, total in Counter(user_ids).items()}
+
+
+def get_unread_count(user_id):
+    shared = cache_is_shared()
+    count = cache.get(unread_cache_key(user_id)) if shared else None
+    if count is None:
+        counter = UnreadCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+        if counter is None:
+            # First poll from this user: seed the counter from the notifications table once
+            counter = Notification.objects.filter(recipient_id=user_id, read=False).count()
+            UnreadCounter.objects.get_or_create(user_id=user_id, defaults={'count': counter})
+        count = max(counter, 0)
+        if shared:
+            cache.set(unread_cache_key(user_id), count, UNREAD_CACHE_TIMEOUT)
+    return count
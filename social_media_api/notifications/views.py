@@ -1,11 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from social_media_api.pagination import TimestampCursorPagination
 from .models import Notification
-from .serializers import NotificationSerializer
+from .bulk import mark_read, delete_read
+from .prefetch import prefetch_targets
+from .serializers import NotificationSerializer, MarkReadSerializer, DeleteReadSerializer
+from .unread import adjust_unread, get_unread_count
+
+INBOX_DAYS = getattr(settings, 'NOTIFICATION_INBOX_DAYS', 90)
+
 
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all().order_by('-timestamp')
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
 
     def get_queryset(self):
-        return self.queryset.filter(recipient=self.request.user)
+        queryset = self.queryset.filter(recipient=self.request.user)
+        # Listings only read recent months, so PostgreSQL prunes the query to the
+        # newest partitions; ?history=true reaches every month still in the live table
+        if self.action == 'list' and self.request.query_params.get('history') not in ('1', 'true'):
+            cutoff = timezone.now() - timedelta(days=INBOX_DAYS)
+            queryset = queryset.filter(created_at__gte=cutoff)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return prefetch_targets(page) if page is not None else None
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        notification = serializer.save()
+        if not notification.read:
+            adjust_unread({notification.recipient_id: 1})
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Locked, so concurrent PATCHes of the same notification change the counter once
+        was_read = Notification.objects.select_for_update().values_list('read', flat=True).get(
+            pk=serializer.instance.pk)
+        notification = serializer.save()
+        if notification.read != was_read:
+            adjust_unread({notification.recipient_id: -1 if notification.read else 1})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        was_read = Notification.objects.select_for_update().values_list('read', flat=True).get(pk=instance.pk)
+        instance.delete()
+        if not was_read:
+            adjust_unread({instance.recipient_id: -1})
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        # Served from the cache or the counter row; never counts notifications
+        return Response({'unread': get_unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        notifications = self.get_queryset()
+        if 'until' in serializer.validated_data:
+            notifications = notifications.filter(timestamp__lte=serializer.validated_data['until'])
+        else:
+            notifications = notifications.filter(id__in=serializer.validated_data['ids'])
+        return Response({'marked_read': mark_read(notifications)})
+
+    @action(detail=False, methods=['post'], url_path='delete-read')
+    def delete_read(self, request):
+        serializer = DeleteReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cutoff = timezone.now() - timedelta(days=serializer.validated_data['older_than_days'])
+        return Response({'deleted': delete_read(self.get_queryset().filter(timestamp__lt=cutoff))})
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        import posts.signals
+        from social_media_api.caching import check_shared_cache
+        from .search import repair_search_index
+
+        checks.register(check_shared_cache, checks.Tags.caches)
+        post_migrate.connect(repair_search_index, sender=self)
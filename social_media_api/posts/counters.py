@@ -0,0 +1,117 @@
+"""
+Like counters for hot posts.
+
+Every like of a post normally updates ``Post.likes_count``, so a viral post
+serialises all of its likes on one row lock. Once a post receives more than
+LIKE_SHARDING_RATE_THRESHOLD likes in a minute it switches to sharded mode:
+each like updates one of LIKE_COUNTER_SHARDS rows picked at random, and the
+total is ``likes_count`` plus the sum of the shards, cached for a few seconds.
+The rate is counted in the cache, so posts are only switched automatically
+when every worker shares it (see social_media_api.caching).
+"""
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+
+from social_media_api.caching import cache_is_shared
+from .models import Post, LikeCounterShard
+
+COUNTER_DEFAULTS = {
+    'LIKE_COUNTER_SHARDS': 16,
+    # Likes per minute on one post that switch it to sharded counting
+    'LIKE_SHARDING_RATE_THRESHOLD': 120,
+    # How long the summed total of a sharded post is cached, in seconds
+    'LIKE_SHARD_TOTAL_CACHE_TIMEOUT': 5,
+}
+
+
+def counter_setting(name):
+    return getattr(settings, name, COUNTER_DEFAULTS[name])
+
+
+SHARDED_LIKES_CHANGED_KEY = 'posts:sharded-likes-changed'
+
+
+def _total_cache_key(post_id):
+    return f'posts:likes-total:{post_id}'
+
+
+def sharded_totals_may_be_stale():
+    """Whether a cached sharded total may still miss a like committed in the last cache timeout."""
+    return cache.get(SHARDED_LIKES_CHANGED_KEY) is not None
+
+
+def _record_like_rate(post):
+    """Count likes of ``post`` in the current minute and shard it once it is hot."""
+    if not cache_is_shared():
+        return  # Each worker would only see its own share of the rate
+    key = f'posts:like-rate:{post.pk}:{int(time.time() // 60)}'
+    cache.add(key, 0, 120)
+    try:
+        rate = cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        return
+    if rate >= counter_setting('LIKE_SHARDING_RATE_THRESHOLD'):
+        Post.objects.filter(pk=post.pk, sharded_likes=False).update(sharded_likes=True)
+        post.sharded_likes = True
+
+
+def _increment_shard(post_id, delta):
+    shard = random.randrange(counter_setting('LIKE_COUNTER_SHARDS'))
+    updated = LikeCounterShard.objects.filter(post_id=post_id, shard=shard).update(count=F('count') + delta)
+    if not updated:
+        LikeCounterShard.objects.bulk_create(
+            [LikeCounterShard(post_id=post_id, shard=shard)], ignore_conflicts=True,
+        )
+        LikeCounterShard.objects.filter(post_id=post_id, shard=shard).update(count=F('count') + delta)
+    # A total cached just before the commit stays stale for up to its timeout after it
+    timeout = counter_setting('LIKE_SHARD_TOTAL_CACHE_TIMEOUT')
+    transaction.on_commit(lambda: cache.set(SHARDED_LIKES_CHANGED_KEY, 1, timeout))
+
+
+def adjust_like_count(post, delta):
+    """Add ``delta`` to the like count of ``post`` inside the caller's transaction."""
+    if delta > 0:
+        _record_like_rate(post)
+    if post.sharded_likes:
+        _increment_shard(post.pk, delta)
+    elif delta < 0:
+        Post.objects.filter(pk=post.pk, likes_count__gt=0).update(likes_count=F('likes_count') + delta)
+    else:
+        Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + delta)
+
+
+def adjust_like_counts(posts, delta):
+    """Add ``delta`` to the like count of every post in ``posts`` with one UPDATE for unsharded posts."""
+    unsharded = []
+    for post in posts:
+        if delta > 0:
+            _record_like_rate(post)
+        if post.sharded_likes:
+            _increment_shard(post.pk, delta)
+        else:
+            unsharded.append(post.pk)
+    if not unsharded:
+        return
+    queryset = Post.objects.filter(pk__in=unsharded)
+    if delta < 0:
+        queryset = queryset.filter(likes_count__gt=0)
+    queryset.update(likes_count=F('likes_count') + delta)
+
+
+def get_like_count(post):
+    """Total likes of ``post``; sharded posts are summed and cached briefly."""
+    if not post.sharded_likes:
+        return post.likes_count
+    key = _total_cache_key(post.pk)
+    total = cache.get(key)
+    if total is None:
+        shards = LikeCounterShard.objects.filter(post_id=post.pk).aggregate(total=Sum('count'))['total']
+        total = post.likes_count + (shards or 0)
+        cache.set(key, total, counter_setting('LIKE_SHARD_TOTAL_CACHE_TIMEOUT'))
+    return total
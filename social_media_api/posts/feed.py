@@ -0,0 +1,230 @@
+"""
+Materialized home timelines.
+
+Every post is pushed ("fanned out") into a FeedEntry row for each follower of
+its author when it is created, so reading a timeline is a single range scan
+over the reader's own entries instead of a join across everyone they follow.
+
+Authors with more than FEED_FANOUT_FOLLOWER_THRESHOLD followers are not fanned
+out (one post would mean hundreds of thousands of inserts). Their recent posts
+are pulled when a feed is read and merged with the materialized entries, up
+to FEED_PULL_MAX_SOURCES authors and FEED_PULL_PER_SOURCE_LIMIT posts each
+per page (see _pulled_streams for how capped sources resume).
+"""
+import heapq
+import itertools
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from rest_framework.settings import api_settings
+
+from accounts.models import Follow
+
+from .models import FeedEntry, Post
+
+User = get_user_model()
+
+FEED_DEFAULTS = {
+    # How many entries are kept per user; older ones are removed by trim_feeds
+    'FEED_MAX_LENGTH': 800,
+    # How many follower rows are written per INSERT when fanning out a post
+    'FEED_FANOUT_BATCH_SIZE': 1000,
+    # Authors with at least this many followers are pulled at read time instead
+    'FEED_FANOUT_FOLLOWER_THRESHOLD': 10000,
+    # Maximum number of pulled authors merged into one feed page
+    'FEED_PULL_MAX_SOURCES': 50,
+    # Maximum number of posts read from each pulled author per page
+    'FEED_PULL_PER_SOURCE_LIMIT': 20,
+    # How long the set of pulled authors is cached, in seconds
+    'FEED_PULL_AUTHORS_CACHE_TIMEOUT': 300,
+}
+
+PULL_AUTHORS_CACHE_KEY = 'posts:feed:pull-authors'
+
+
+def feed_setting(name):
+    return getattr(settings, name, FEED_DEFAULTS[name])
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def pull_author_ids():
+    """Ids of the authors whose posts are merged at read time instead of fanned out."""
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = set(
+            User.objects.filter(followers_count__gte=feed_setting('FEED_FANOUT_FOLLOWER_THRESHOLD'))
+            .values_list('id', flat=True)
+        )
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids, feed_setting('FEED_PULL_AUTHORS_CACHE_TIMEOUT'))
+    return author_ids
+
+
+def is_pull_author(author):
+    return author.followers_count >= feed_setting('FEED_FANOUT_FOLLOWER_THRESHOLD')
+
+
+def fan_out_post(post):
+    """Insert ``post`` into the timeline of every follower of its author."""
+    if is_pull_author(post.author):
+        # Make the post visible to readers right away rather than on the next cache refresh
+        author_ids = pull_author_ids()
+        if post.author_id not in author_ids:
+            cache.set(PULL_AUTHORS_CACHE_KEY, author_ids | {post.author_id},
+                      feed_setting('FEED_PULL_AUTHORS_CACHE_TIMEOUT'))
+        return 0
+    batch_size = feed_setting('FEED_FANOUT_BATCH_SIZE')
+    follower_ids = Follow.objects.filter(followee_id=post.author_id).values_list('follower_id', flat=True).iterator(chunk_size=batch_size)
+    written = 0
+    for batch in _batched(follower_ids, batch_size):
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(owner_id=owner_id, post_id=post.id) for owner_id in batch],
+            ignore_conflicts=True,
+        )
+        written += len(batch)
+    return written
+
+
+def add_author_to_feed(owner_id, author_id):
+    """Backfill the most recent posts of ``author_id`` after a new follow."""
+    if author_id in pull_author_ids():
+        return
+    post_ids = (Post.objects.filter(author_id=author_id)
+                .order_by('-id')
+                .values_list('id', flat=True)[:feed_setting('FEED_MAX_LENGTH')])
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=owner_id, post_id=post_id) for post_id in post_ids],
+        batch_size=feed_setting('FEED_FANOUT_BATCH_SIZE'),
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_feed(owner_id, author_id):
+    """Drop every entry written by ``author_id`` from the timeline of ``owner_id``."""
+    FeedEntry.objects.filter(owner_id=owner_id, post__author_id=author_id).delete()
+
+
+def backfill_feed(owner):
+    """Rebuild the timeline of ``owner`` from the accounts they currently follow."""
+    followed = (Follow.objects.filter(follower=owner)
+                .exclude(followee_id__in=pull_author_ids())
+                .values('followee_id'))
+    post_ids = (Post.objects.filter(author_id__in=followed)
+                .order_by('-id')
+                .values_list('id', flat=True)[:feed_setting('FEED_MAX_LENGTH')])
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=owner.id, post_id=post_id) for post_id in post_ids],
+        batch_size=feed_setting('FEED_FANOUT_BATCH_SIZE'),
+        ignore_conflicts=True,
+    )
+    return trim_feed(owner.id)
+
+
+def trim_feed(owner_id, max_length=None):
+    """Delete entries of ``owner_id`` beyond the newest ``max_length``."""
+    max_length = max_length or feed_setting('FEED_MAX_LENGTH')
+    boundary = (FeedEntry.objects.filter(owner_id=owner_id)
+                .order_by('-post_id')
+                .values_list('post_id', flat=True)[max_length:max_length + 1])
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    deleted, _ = FeedEntry.objects.filter(owner_id=owner_id, post_id__lte=boundary[0]).delete()
+    return deleted
+
+
+def _materialized_stream(owner, before, limit):
+    entries = FeedEntry.objects.filter(owner=owner)
+    if before:
+        entries = entries.filter(post_id__lt=before)
+    return entries.order_by('-post_id').values_list('post_id', flat=True)[:limit]
+
+
+def _pulled_streams(owner, before, limit):
+    """
+    Newest-first lists of post ids of the pulled authors followed by ``owner``,
+    and the lowest post id the merged page may include (None for no limit).
+
+    The FEED_PULL_MAX_SOURCES authors with the newest posts are merged, found
+    with one post_author_id_idx probe per followed pulled author. Each is read
+    with its own ``ORDER BY id DESC LIMIT`` over that index, at most
+    FEED_PULL_PER_SOURCE_LIMIT posts, so the cost follows the page size and not
+    the authors' post history. A source that filled its limit may hold more
+    posts just below the last one read, and a source left out may hold posts
+    up to its newest, so the page stops above both: it can come out short, but
+    the next ``before`` cursor reads every source again from where the page
+    stopped and no post is skipped.
+    """
+    pull_ids = pull_author_ids()
+    if not pull_ids:
+        return [], None
+    max_sources = feed_setting('FEED_PULL_MAX_SOURCES')
+    per_source = min(limit, feed_setting('FEED_PULL_PER_SOURCE_LIMIT'))
+
+    newest = Post.objects.filter(author_id=OuterRef('followee_id'))
+    if before:
+        newest = newest.filter(id__lt=before)
+    sources = list(Follow.objects.filter(follower=owner, followee_id__in=pull_ids)
+                   .annotate(newest=Subquery(newest.order_by('-id').values('id')[:1]))
+                   .filter(newest__isnull=False)
+                   .order_by('-newest')
+                   .values_list('followee_id', 'newest')[:max_sources + 1])
+    if not sources:
+        return [], None
+    floor = None
+    if len(sources) > max_sources:
+        floor = sources.pop()[1] + 1
+
+    queries = []
+    for author_id, _ in sources:
+        posts = Post.objects.filter(author_id=author_id)
+        if before:
+            posts = posts.filter(id__lt=before)
+        queries.append(posts.order_by('-id').values_list('author_id', 'id')[:per_source])
+    if connection.features.supports_slicing_ordering_in_compound:
+        rows = queries[0].union(*queries[1:], all=True)
+    else:
+        # SQLite cannot LIMIT the parts of a UNION
+        rows = itertools.chain.from_iterable(queries)
+
+    streams = {}
+    for author_id, post_id in rows:
+        streams.setdefault(author_id, []).append(post_id)
+    for stream in streams.values():
+        stream.sort(reverse=True)
+        if len(stream) == per_source:
+            floor = stream[-1] if floor is None else max(floor, stream[-1])
+    return list(streams.values()), floor
+
+
+def read_feed(owner, before=None, limit=None):
+    """Return the newest posts in the timeline of ``owner``, optionally older than post id ``before``."""
+    limit = limit or api_settings.PAGE_SIZE
+    pulled, floor = _pulled_streams(owner, before, limit)
+    streams = [list(_materialized_stream(owner, before, limit)), *pulled]
+
+    # k-way merge of newest-first streams; a post can appear twice if its
+    # author crossed the threshold after it was fanned out
+    post_ids = []
+    for post_id in heapq.merge(*streams, key=lambda post_id: -post_id):
+        if floor is not None and post_id < floor:
+            break  # A pulled author not read this far may have newer posts; the next page has them
+        if not post_ids or post_ids[-1] != post_id:
+            post_ids.append(post_id)
+        if len(post_ids) == limit:
+            break
+
+    posts = Post.objects.select_related('author').in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
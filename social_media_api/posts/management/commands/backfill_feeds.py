@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.feed import backfill_feed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Build materialized home timelines from the existing follow relationships'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild the feed of this user id (can be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of users loaded per query')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(following_edges__isnull=False).distinct().order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        count = 0
+        for user in users.iterator(chunk_size=options['chunk_size']):
+            backfill_feed(user)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {count} feeds'))
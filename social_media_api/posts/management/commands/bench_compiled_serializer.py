@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.serializers import PostSerializer
+from social_media_api.compiled_serializers import compile_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure serialization throughput of PostSerializer against its compiled form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--requests', type=int, default=20, help='Pages serialized per mode')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author = User.objects.create(username='bench-compiled')
+            Post.objects.bulk_create(
+                [Post(author=author, title=f'Post {i}', content='Lorem ipsum ' * 40) for i in range(options['posts'])]
+            )
+            queryset = Post.objects.filter(author=author).select_related('author').order_by('id')
+            compiled = compile_serializer(PostSerializer)
+
+            def stock():
+                return PostSerializer(queryset.all(), many=True).data
+
+            def fast():
+                return compiled.serialize(queryset.all())
+
+            if stock() != fast():
+                self.stderr.write('Compiled output differs from PostSerializer output')
+            for name, serialize in (('serializer', stock), ('compiled', fast)):
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    serialize()
+                elapsed = time.perf_counter() - started
+                rows_per_second = options['posts'] * options['requests'] / elapsed
+                self.stdout.write(f'{name}: {elapsed / options["requests"] * 1000:.1f} ms per page of '
+                                  f'{options["posts"]} rows ({rows_per_second:,.0f} rows/s)')
+
+            transaction.set_rollback(True)
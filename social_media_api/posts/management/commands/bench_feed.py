@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.feed import PULL_AUTHORS_CACHE_KEY, read_feed
+from accounts.models import Follow
+from posts.models import FeedEntry, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare write amplification and read latency of pushed and pulled feeds on the local database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=2000, help='Followers of the benchmark author')
+        parser.add_argument('--posts', type=int, default=20, help='Posts written by the benchmark author')
+        parser.add_argument('--reads', type=int, default=200, help='Feed reads timed per mode')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back so the benchmark leaves no rows behind
+        with transaction.atomic():
+            author, readers = self._create_graph(options['followers'])
+            # Threshold above the follower count means push, at or below it means pull
+            for mode, threshold in (('push', options['followers'] + 1), ('pull', 1)):
+                with override_settings(FEED_FANOUT_FOLLOWER_THRESHOLD=threshold):
+                    self._run(mode, author, readers[0], options['posts'], options['reads'])
+            transaction.set_rollback(True)
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+
+    def _create_graph(self, followers):
+        author = User.objects.create(username='bench-author', followers_count=followers)
+        readers = User.objects.bulk_create(
+            [User(username=f'bench-reader-{i}') for i in range(followers)], batch_size=1000,
+        )
+        Follow.objects.bulk_create(
+            [Follow(follower_id=reader.id, followee_id=author.id) for reader in readers],
+            batch_size=1000,
+        )
+        return author, readers
+
+    def _run(self, mode, author, reader, posts, reads):
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+        entries_before = FeedEntry.objects.count()
+
+        start = time.perf_counter()
+        for i in range(posts):
+            Post.objects.create(author=author, title=f'{mode} {i}', content='benchmark')
+        write_seconds = time.perf_counter() - start
+        written = FeedEntry.objects.count() - entries_before
+
+        start = time.perf_counter()
+        for _ in range(reads):
+            read_feed(reader)
+        read_seconds = time.perf_counter() - start
+
+        self.stdout.write(
+            f'{mode}: {written / posts:.0f} feed rows per post, '
+            f'{write_seconds / posts * 1000:.2f} ms per post, '
+            f'{read_seconds / reads * 1000:.2f} ms per feed read'
+        )
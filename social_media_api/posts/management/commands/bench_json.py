@@ -0,0 +1,68 @@
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from social_media_api.renderers import FastJSONParser, FastJSONRenderer
+
+
+def payloads(rows):
+    """Bodies shaped like each project's list responses, plus raw Python values."""
+    now = timezone.now()
+    posts = [
+        {'id': i, 'author': f'user{i % 50}', 'title': f'Post {i}', 'content': 'Lorem ipsum ' * 40,
+         'created_at': (now - timedelta(minutes=i)).isoformat(), 'updated_at': now.isoformat(),
+         'likes_count': i * 3, 'comments_count': i % 7}
+        for i in range(rows)
+    ]
+    authors = [  # advanced-api-project: AuthorSerializer with nested books
+        {'id': i, 'name': f'Author {i}',
+         'books': [{'id': i * 10 + j, 'title': f'Book {j}', 'publication_year': 1950 + j, 'author': i}
+                   for j in range(10)]}
+        for i in range(rows // 10)
+    ]
+    books = [{'id': i, 'title': f'Book {i}', 'author': f'Author {i % 20}'} for i in range(rows)]  # api_project
+    values = [
+        {'id': uuid.uuid4(), 'at': now - timedelta(seconds=i), 'price': Decimal('19.99'), 'count': i}
+        for i in range(rows)
+    ]
+    return {
+        'social_media_api posts': {'count': rows, 'next': None, 'previous': None, 'results': posts},
+        'advanced-api-project authors': authors,
+        'api_project books': books,
+        'uuid/datetime/decimal values': values,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Measure JSON rendering and parsing with DRF\'s classes and the orjson-backed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per payload')
+        parser.add_argument('--repeat', type=int, default=50, help='Renders and parses per payload and mode')
+
+    def _time(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        modes = (('stdlib', JSONRenderer(), JSONParser()), ('fast', FastJSONRenderer(), FastJSONParser()))
+        for name, data in payloads(options['rows']).items():
+            body = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != body:
+                self.stderr.write(f'{name}: FastJSONRenderer output differs from JSONRenderer')
+            timings = []
+            for mode, renderer, parser in modes:
+                render = self._time(lambda: renderer.render(data), repeat)
+                parse = self._time(lambda: parser.parse(BytesIO(body)), repeat)
+                timings.append(f'{mode} render {render:.2f} ms, parse {parse:.2f} ms')
+            self.stdout.write(f'{name} ({len(body) // 1024} KiB): ' + '; '.join(timings))
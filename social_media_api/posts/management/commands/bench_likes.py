@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from posts.counters import adjust_like_count, get_like_count
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure like counter throughput under parallel writers, with and without sharding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Parallel writer threads')
+        parser.add_argument('--likes', type=int, default=2000, help='Counter increments per mode')
+
+    def handle(self, *args, **options):
+        author = User.objects.create(username=f'bench-likes-{int(time.time())}')
+        try:
+            for sharded in (False, True):
+                post = Post.objects.create(author=author, title='bench', content='bench', sharded_likes=sharded)
+                # Keep each post in the mode it was created in for the whole run
+                with override_settings(LIKE_SHARDING_RATE_THRESHOLD=options['likes'] + 1):
+                    seconds = self._hammer(post, options['workers'], options['likes'])
+                post.refresh_from_db()
+                mode = 'sharded' if sharded else 'single row'
+                self.stdout.write(
+                    f'{mode}: {options["likes"] / seconds:.0f} likes/s '
+                    f'with {options["workers"]} workers (total {get_like_count(post)})'
+                )
+        finally:
+            # Cascades to the benchmark posts and their shards
+            author.delete()
+
+    def _hammer(self, post, workers, likes):
+        def like(_):
+            with transaction.atomic():
+                adjust_like_count(post, 1)
+
+        def run(count):
+            try:
+                for i in range(count):
+                    like(i)
+            finally:
+                connection.close()
+
+        per_worker = [likes // workers + (1 if i < likes % workers else 0) for i in range(workers)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, per_worker))
+        return time.perf_counter() - start
@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from posts.models import Post
+from posts.representations import LIGHT_FIELDS, forget_representations, render_posts
+from posts.serializers import PostSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure serialization CPU per list page with and without cached post fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Posts per page')
+        parser.add_argument('--requests', type=int, default=200, help='Pages rendered per mode')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author = User.objects.create(username='bench-serialization')
+            Post.objects.bulk_create(
+                [Post(author=author, title=f'Post {i}', content='Lorem ipsum ' * 40) for i in range(options['posts'])]
+            )
+            ids = list(Post.objects.filter(author=author).values_list('id', flat=True))
+            full = list(Post.objects.filter(id__in=ids).select_related('author').order_by('-id'))
+            light = list(Post.objects.filter(id__in=ids).only(*LIGHT_FIELDS).order_by('-id'))
+            renderer = JSONRenderer()
+
+            def plain():
+                return renderer.render(PostSerializer(full, many=True).data)
+
+            def cached():
+                return b'[' + b','.join(render_posts(light, PostSerializer)) + b']'
+
+            forget_representations(ids)
+            cached()  # Warm the cache
+            if plain() != cached():
+                self.stderr.write('Cached output differs from PostSerializer output')
+            for name, render in (('serializer', plain), ('cached fragments', cached)):
+                started = time.process_time()
+                for _ in range(options['requests']):
+                    render()
+                per_request = (time.process_time() - started) / options['requests'] * 1000
+                self.stdout.write(f'{name}: {per_request:.2f} ms CPU per page of {options["posts"]} posts')
+
+            forget_representations(ids)
+            transaction.set_rollback(True)
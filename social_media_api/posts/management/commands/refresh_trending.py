@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Rescore trending posts whose likes or comments changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rescore every post in the trending window')
+        parser.add_argument('--once', action='store_true', help='Refresh once and exit')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between refreshes')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.perf_counter()
+            scored, dropped = refresh_trending(full=full)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Scored {scored} posts and dropped {dropped} in {elapsed:.2f}s')
+            if options['once']:
+                return
+            full = False
+            time.sleep(max(options['interval'] - elapsed, 0))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.feed import feed_setting, trim_feed
+from posts.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Trim materialized home timelines to FEED_MAX_LENGTH entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int,
+                            help='Number of entries kept per user (defaults to FEED_MAX_LENGTH)')
+
+    def handle(self, *args, **options):
+        max_length = options['max_length'] or feed_setting('FEED_MAX_LENGTH')
+        owners = (FeedEntry.objects.values('owner_id')
+                  .annotate(entries=Count('id'))
+                  .filter(entries__gt=max_length)
+                  .values_list('owner_id', flat=True))
+
+        deleted = 0
+        for owner_id in owners.iterator():
+            deleted += trim_feed(owner_id, max_length)
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} feed entries'))
@@ -0,0 +1,71 @@
+"""
+Full-text index over post titles and content (see posts.search).
+
+PostgreSQL gets a stored ``search_vector`` tsvector column, generated from
+the title (weight A) and content (weight B) with the 'english' text search
+configuration that posts.search.SEARCH_CONFIG queries with, and a GIN index. SQLite gets an
+external-content FTS5 table kept in step with posts_post by triggers. Other
+databases get nothing and search falls back to substring matching.
+
+SQLite drops triggers when a migration rebuilds posts_post; the posts app
+recreates them after every migrate (posts.search.repair_search_index).
+"""
+from django.db import migrations
+
+TABLE = 'posts_post'
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('english'::regconfig, coalesce(content, '')), 'B')) STORED"
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS post_search_vector_idx ON {TABLE} USING GIN (search_vector)')
+        elif vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"title, content, content='{TABLE}', content_rowid='id', tokenize='porter unicode61')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN '
+                f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END'
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) "
+                f"VALUES ('delete', old.id, old.title, old.content); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON {TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) "
+                f"VALUES ('delete', old.id, old.title, old.content); "
+                f"INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector')
+        elif vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_sharded_likes_likecountershard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
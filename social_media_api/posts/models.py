@@ -11,6 +11,17 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept in step by the views and repaired by reconcile_counters
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # Set once the post is hot: new likes then go to LikeCounterShard rows instead of likes_count
+    sharded_likes = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),  # Keyset pagination
+            models.Index(fields=['author', '-id'], name='post_author_id_idx'),  # Pulled feed sources
+        ]
 
     def __str__(self):
         return self.title
@@ -22,6 +33,13 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),  # Keyset pagination
+            # posts/<pk>/comments/: one post's comments newest first, as a single range scan
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
 
@@ -37,3 +55,36 @@ class Like(models.Model):
         unique_together = ('user', 'post')  # Prevents users from liking the same post multiple times
 
 
+class FeedEntry(models.Model):
+    # One row per (reader, post) in the reader's materialized home timeline
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+
+    class Meta:
+        unique_together = ('owner', 'post')  # Also serves the (owner, post id) range scan used to read a feed
+
+
+class LikeCounterShard(models.Model):
+    # Part of the like count of a hot post; the total is likes_count plus every shard
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='like_shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)  # Can go negative when older likes are removed
+
+    class Meta:
+        unique_together = ('post', 'shard')
+
+
+class TrendingScore(models.Model):
+    # Time-decayed engagement score of a recent post, maintained by refresh_trending (posts.trending)
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    score = models.FloatField()
+    # Counters the score was computed from; a post is rescored once they move
+    likes_count = models.PositiveIntegerField()
+    comments_count = models.PositiveIntegerField()
+    post_created_at = models.DateTimeField(db_index=True)
+    scored_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='trending_score_idx'),  # Keyset pagination
+        ]
@@ -0,0 +1,134 @@
+"""
+Cached JSON fragments of serialized posts.
+
+A list page is built from a light query (ids, timestamps and counters only):
+the static part of every post (everything PostSerializer renders except the
+like and comment counters) is fetched from the cache in one get_many, only
+the misses are loaded and serialized (by the compiled serializer, see
+social_media_api.compiled_serializers), and the fragments are spliced into the
+body the accepted renderer makes of the paginated envelope, with the current
+counters appended. Counters change far more often
+than posts are edited, so they are never cached.
+
+Entries are keyed by post id and hold the ``updated_at`` they were rendered
+from, so an edit is never served stale even before the post_save signal has
+dropped the entry. Author username changes drop every entry of the author.
+"""
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.response import Response
+
+from social_media_api.compiled_serializers import compile_serializer
+from social_media_api.renderers import FastJSONRenderer
+
+from .counters import get_like_count
+
+REPRESENTATION_CACHE_TIMEOUT = getattr(settings, 'POST_REPRESENTATION_CACHE_TIMEOUT', 300)
+# Rendered on every request, after the cached fragment
+VOLATILE_FIELDS = ('likes_count', 'comments_count')
+# Enough for pagination, search/trending ranking and the volatile fields
+LIGHT_FIELDS = ('id', 'created_at', 'updated_at', 'likes_count', 'comments_count', 'sharded_likes')
+# Stands in for the results while the rest of the paginated envelope is rendered
+RESULTS_PLACEHOLDER = 'posts:rendered-results'
+
+
+def representation_cache_key(post_id):
+    return f'posts:repr:{post_id}'
+
+
+def forget_representations(post_ids):
+    cache.delete_many([representation_cache_key(post_id) for post_id in post_ids])
+
+
+def _fragment(data, renderer):
+    # '{"id":1,...,"updated_at":"..."' -- left open for the volatile fields
+    static = {name: value for name, value in data.items() if name not in VOLATILE_FIELDS}
+    return renderer.render(static)[:-1]
+
+
+def render_posts(posts, serializer_class):
+    """
+    JSON bytes of every post in ``posts`` (light instances, see LIGHT_FIELDS),
+    in order. Cache misses are rendered with the compiled ``serializer_class``.
+    """
+    renderer = FastJSONRenderer()
+    keys = {post.pk: representation_cache_key(post.pk) for post in posts}
+    cached = cache.get_many(keys.values())
+    fragments = {}
+    for post in posts:
+        entry = cached.get(keys[post.pk])
+        if entry is not None and entry[0] == post.updated_at:
+            fragments[post.pk] = entry[1]
+
+    misses = {post.pk: post for post in posts if post.pk not in fragments}
+    if misses:
+        compiled = compile_serializer(serializer_class)
+        to_cache = {}
+        for data in compiled.serialize(serializer_class.Meta.model.objects.filter(pk__in=misses)):
+            post = misses[data['id']]
+            fragments[post.pk] = _fragment(data, renderer)
+            to_cache[keys[post.pk]] = (post.updated_at, fragments[post.pk])
+        cache.set_many(to_cache, REPRESENTATION_CACHE_TIMEOUT)
+
+    return [
+        fragments[post.pk] + b',"likes_count":%d,"comments_count":%d}' % (get_like_count(post), post.comments_count)
+        for post in posts if post.pk in fragments
+    ]
+
+
+class RenderedPosts(Sequence):
+    """Posts already rendered to JSON; items are decoded on access, for readers of ``response.data``."""
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [json.loads(fragment) for fragment in self.fragments[index]]
+        return json.loads(self.fragments[index])
+
+
+class RenderedPostsResponse(Response):
+    """
+    A paginated response whose ``results`` are RenderedPosts. The envelope goes
+    through the accepted renderer as usual, with a placeholder string for the
+    results that the fragments then replace.
+    """
+
+    @property
+    def rendered_content(self):
+        data = self.data
+        self.data = {**data, 'results': RESULTS_PLACEHOLDER}
+        try:
+            body = super().rendered_content
+        finally:
+            self.data = data
+        placeholder = json.dumps(RESULTS_PLACEHOLDER).encode()
+        if body.count(placeholder) != 1:
+            raise ImproperlyConfigured(
+                f'{type(self.accepted_renderer).__name__} did not render the results placeholder as a JSON string.'
+            )
+        return body.replace(placeholder, b'[' + b','.join(data['results'].fragments) + b']')
+
+
+class CachedPostListMixin:
+    """Serve JSON list pages of posts from cached fragments; other formats take the normal path."""
+
+    def paginate_posts(self, queryset):
+        request = self.request
+        if getattr(request.accepted_renderer, 'format', None) != 'json' or self.paginator is None:
+            return None
+        page = self.paginate_queryset(queryset.select_related(None).prefetch_related(None).only(*LIGHT_FIELDS))
+        posts = RenderedPosts(render_posts(page, self.get_serializer_class()))
+        return RenderedPostsResponse(self.get_paginated_response(posts).data)
+
+    def list(self, request, *args, **kwargs):
+        response = self.paginate_posts(self.filter_queryset(self.get_queryset()))
+        return response if response is not None else super().list(request, *args, **kwargs)
@@ -0,0 +1,166 @@
+"""
+Whole-response cache for anonymous reads of posts.
+
+Anonymous JSON GETs of the post list and post details are cached under a key
+made of the path, the sorted query parameters and a generation number. Every
+save or delete of a Post or Comment, and every author rename, bumps the
+generation of the posts involved (used by their detail pages) and the
+generation of the list (used by every list page) once the transaction
+commits, so stale entries are never read again and simply expire. Likes only
+bump their post: they are too frequent to expire every list page, whose like
+counts may lag by up to ANON_RESPONSE_CACHE_TIMEOUT seconds.
+
+To keep a popular page from sending every worker to the database when it
+expires, entries are fresh for ANON_RESPONSE_CACHE_TIMEOUT seconds and kept
+for ANON_RESPONSE_CACHE_STALE_TIMEOUT more. The first request to find an
+entry stale takes a short lock and rebuilds it; the others keep serving the
+stale copy. When there is no copy at all (a new generation), requests that do
+not get the lock wait up to ANON_RESPONSE_CACHE_WAIT seconds for the winner.
+
+Generations and locks only work in a cache every worker shares, so nothing is
+cached on a process-local backend (see social_media_api.caching).
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from social_media_api.caching import cache_is_shared
+
+RESPONSE_CACHE_DEFAULTS = {
+    'ANON_RESPONSE_CACHE_TIMEOUT': 30,
+    'ANON_RESPONSE_CACHE_STALE_TIMEOUT': 60,
+    'ANON_RESPONSE_CACHE_LOCK_TIMEOUT': 10,
+    'ANON_RESPONSE_CACHE_WAIT': 0.5,
+}
+
+LIST_GENERATION_KEY = 'posts:response-gen:list'
+# Header values replayed on cache hits
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def response_cache_setting(name):
+    return getattr(settings, name, RESPONSE_CACHE_DEFAULTS[name])
+
+
+def post_generation_key(post_id):
+    return f'posts:response-gen:{post_id}'
+
+
+def _new_generation():
+    # Above any number handed out before the key was evicted
+    return int(time.time() * 1000)
+
+
+def get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generations(post_ids, lists=True):
+    """Invalidate the detail pages of ``post_ids``, and cached list pages, once the transaction commits."""
+    keys = [post_generation_key(post_id) for post_id in set(post_ids)]
+    if lists:
+        keys.append(LIST_GENERATION_KEY)
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_generation(), None)
+    transaction.on_commit(bump)
+
+
+def response_cache_key(request, generation):
+    query = urlencode(sorted((name, value) for name, values in request.GET.lists() for value in values))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode(), usedforsecurity=False).hexdigest()
+    return f'posts:response:{generation}:{digest}'
+
+
+class AnonymousResponseCacheMixin:
+    """Cache ``list`` and ``retrieve`` responses of anonymous JSON GETs."""
+
+    def is_response_cacheable(self, request):
+        # A timeout of 0 turns the cache off
+        return (response_cache_setting('ANON_RESPONSE_CACHE_TIMEOUT') > 0 and cache_is_shared()
+                and request.method == 'GET' and not request.user.is_authenticated
+                and getattr(request.accepted_renderer, 'format', None) == 'json')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_read(request, LIST_GENERATION_KEY, lambda: super(AnonymousResponseCacheMixin, self).list(
+            request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_read(request, post_generation_key(lookup), lambda: super(
+            AnonymousResponseCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    def cached_read(self, request, generation_key, respond):
+        if not self.is_response_cacheable(request):
+            return respond()
+        key = response_cache_key(request, get_generation(generation_key))
+        entry = cache.get(key)
+        if entry is not None and entry['fresh_until'] > time.time():
+            return self._replay(request, entry)
+
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, response_cache_setting('ANON_RESPONSE_CACHE_LOCK_TIMEOUT'))
+        if not locked:
+            if entry is not None:
+                return self._replay(request, entry)  # Someone else is rebuilding it
+            entry = self._wait_for(key)
+            if entry is not None:
+                return self._replay(request, entry)
+        try:
+            return self._store(request, key, respond())
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + response_cache_setting('ANON_RESPONSE_CACHE_WAIT')
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def _store(self, request, key, response):
+        if response.status_code != 200:
+            return response
+        response = self.finalize_response(request, response)
+        if isinstance(response, SimpleTemplateResponse):
+            response.render()
+        fresh = response_cache_setting('ANON_RESPONSE_CACHE_TIMEOUT')
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {name: response[name] for name in CACHED_HEADERS if response.has_header(name)},
+            'fresh_until': time.time() + fresh,
+        }
+        cache.set(key, entry, fresh + response_cache_setting('ANON_RESPONSE_CACHE_STALE_TIMEOUT'))
+        return response
+
+    def _replay(self, request, entry):
+        headers = entry['headers']
+        last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+        not_modified = get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        for name, value in headers.items():
+            response[name] = value
+        return response
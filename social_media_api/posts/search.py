@@ -0,0 +1,174 @@
+"""
+Full-text search over post titles and content.
+
+``?search=`` accepts plain words, ``"quoted phrases"`` and ``prefix*`` terms;
+every term must match. On PostgreSQL the query runs against the stored
+``search_vector`` column through its GIN index and is ranked with
+``ts_rank``; on SQLite it runs against the ``posts_post_fts`` FTS5 table and
+is ranked with ``bm25``. Both indexes are created by migration 0005, and the
+SQLite triggers are recreated after every migrate by ``repair_search_index``.
+Other databases fall back to unranked substring matching.
+
+Matching rows carry a ``search_rank`` annotation (higher is better) and come
+best match first; RankedCursorPagination pages over it.
+"""
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+from .models import Post
+
+SEARCH_MAX_TERMS = getattr(settings, 'POST_SEARCH_MAX_TERMS', 8)
+# The search_vector column is generated with this configuration by migration 0005; changing it
+# takes a migration that regenerates the column, or queries stop matching the stored lexemes
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'posts_post_fts'
+
+TOKEN_RE = re.compile(r'"([^"]*)"?|(\S+)')
+WORD_RE = re.compile(r'\w+')
+
+
+def parse_query(text):
+    """
+    Split ``text`` into ``(kind, words)`` terms where kind is 'word',
+    'phrase' or 'prefix'. Only ``\\w`` characters survive, so terms are safe to
+    embed in tsquery and FTS5 syntax.
+    """
+    terms = []
+    for match in TOKEN_RE.finditer(text):
+        phrase, token = match.groups()
+        words = WORD_RE.findall(phrase if phrase is not None else token)
+        if not words:
+            continue
+        if len(words) > 1:
+            terms.append(('phrase', words))
+        elif phrase is None and token.endswith('*'):
+            terms.append(('prefix', words))
+        else:
+            terms.append(('word', words))
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def _tsquery(terms):
+    parts = []
+    for kind, words in terms:
+        if kind == 'phrase':
+            parts.append('(' + ' <-> '.join(f"'{word}'" for word in words) + ')')
+        elif kind == 'prefix':
+            parts.append(f"'{words[0]}':*")
+        else:
+            parts.append(f"'{words[0]}'")
+    return ' & '.join(parts)
+
+
+def _fts5_query(terms):
+    parts = []
+    for kind, words in terms:
+        quoted = '"' + ' '.join(words) + '"'
+        parts.append(quoted + '*' if kind == 'prefix' else quoted)
+    return ' AND '.join(parts)
+
+
+def _search_postgresql(queryset, terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+    vector = RawSQL(f'"{Post._meta.db_table}"."search_vector"', [], output_field=SearchVectorField())
+    query = SearchQuery(_tsquery(terms), search_type='raw', config=SEARCH_CONFIG)
+    # ts_rank is a real; as double precision it survives the round trip through a cursor unchanged
+    return (queryset.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(search_rank=Cast(SearchRank(vector, query), FloatField())))
+
+
+def _search_sqlite(queryset, terms):
+    match = _fts5_query(terms)
+    table = Post._meta.db_table
+    # bm25 is lower for better matches; title hits weigh twice as much as content hits
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, 2.0, 1.0) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        [match], output_field=FloatField(),
+    )
+    matching = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    return queryset.filter(id__in=matching).annotate(search_rank=rank)
+
+
+def _search_substring(queryset, terms):
+    for _, words in terms:
+        text = ' '.join(words)
+        queryset = queryset.filter(Q(title__icontains=text) | Q(content__icontains=text))
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_posts(queryset, text):
+    """Posts of ``queryset`` matching ``text``, annotated with ``search_rank``."""
+    terms = parse_query(text)
+    if not terms:
+        return _search_substring(queryset.none(), terms)
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, terms)
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, terms)
+    return _search_substring(queryset, terms)
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """``?search=`` backed by the full-text index instead of ILIKE scans."""
+
+    def get_search_text(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        return search_posts(queryset, text).order_by('-search_rank', '-id')
+
+
+# The triggers of migration 0005 that keep the FTS5 table in step with posts_post on SQLite
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END'
+    ),
+    f'{FTS_TABLE}_ad': (
+        f"AFTER DELETE ON posts_post BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) "
+        f"VALUES ('delete', old.id, old.title, old.content); END"
+    ),
+    f'{FTS_TABLE}_au': (
+        f"AFTER UPDATE OF title, content ON posts_post BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) "
+        f"VALUES ('delete', old.id, old.title, old.content); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+    ),
+}
+
+
+def repair_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Recreate SQLite triggers a table-rebuilding migration dropped (post_migrate receiver).
+
+    SQLite applies most schema changes to posts_post by copying it into a new
+    table, which loses the triggers; posts written afterwards would never be
+    found. Missing triggers are recreated and the index rebuilt from the table.
+    Returns the names of the recreated triggers.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        if FTS_TABLE not in connection.introspection.table_names(cursor):
+            return []  # Migration 0005 is not applied
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'posts_post'")
+        missing = set(SQLITE_TRIGGERS) - {row[0] for row in cursor.fetchall()}
+        for name in sorted(missing):
+            cursor.execute(f'CREATE TRIGGER {name} {SQLITE_TRIGGERS[name]}')
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return sorted(missing)
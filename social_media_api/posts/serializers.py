@@ -1,14 +1,22 @@
 from rest_framework import serializers
+from .counters import get_like_count
 from .models import Post, Comment
 from rest_framework import serializers
 from .models import Like
 
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')  # Show author's username, not ID
+    likes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at']
+        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'likes_count', 'comments_count']
+        read_only_fields = ['comments_count']
+        # Columns read by get_likes_count, for QueryPlanMixin
+        plan_extra_fields = ['likes_count', 'sharded_likes']
+
+    def get_likes_count(self, obj):
+        return get_like_count(obj)
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')  # Show author's username
@@ -23,3 +31,13 @@ class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ['user', 'post', 'created_at']
+
+
+class ReactionSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=['like', 'unlike'])
+
+
+class ReactionBatchSerializer(serializers.Serializer):
+    # Reactions queued by a client while offline, applied in the order given
+    operations = ReactionSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.signals import followed, unfollowed
+from social_media_api.conditional import bump_versions
+
+from .feed import fan_out_post, add_author_to_feed, remove_author_from_feed
+from .models import Post, Comment, Like
+from .representations import forget_representations
+from .response_cache import bump_generations
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_followers(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_post_representation(sender, instance, **kwargs):
+    post_id = instance.pk
+    forget_representations([post_id])
+    # Again after commit, in case a concurrent reader cached the old row in between
+    transaction.on_commit(lambda: forget_representations([post_id]))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def expire_cached_responses(sender, instance, **kwargs):
+    # List pages pick up new like counts when they expire
+    bump_generations([instance.pk if sender is Post else instance.post_id], lists=sender is not Like)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def expire_list_validators(sender, instance, **kwargs):
+    # Likes and comments change the counters on their post
+    bump_versions({sender, Post})
+
+
+@receiver(pre_save, sender=User)
+def remember_old_username(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    instance._old_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def forget_author_representations(sender, instance, created, **kwargs):
+    old_username = getattr(instance, '_old_username', None)
+    if created or old_username is None or old_username == instance.username:
+        return
+    # Cached fragments, responses and validators embed the author's username
+    post_ids = list(Post.objects.filter(author=instance).values_list('id', flat=True))
+    transaction.on_commit(lambda: forget_representations(post_ids))
+    bump_generations(post_ids)
+    bump_versions([User])
+
+
+@receiver(followed)
+def add_followed_posts(sender, follower_id, followee_id, **kwargs):
+    add_author_to_feed(follower_id, followee_id)
+
+
+@receiver(unfollowed)
+def remove_unfollowed_posts(sender, follower_id, followee_id, **kwargs):
+    remove_author_from_feed(follower_id, followee_id)
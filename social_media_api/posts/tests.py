@@ -1,3 +1,779 @@
-from django.test import TestCase
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from social_media_api.caching import check_shared_cache
+from social_media_api.compiled_serializers import compile_serializer
+from social_media_api.pagination import KeysetCursorPagination
+from social_media_api.query_planning import plan_for
+from social_media_api.renderers import FastJSONRenderer
+from .counters import get_like_count
+from .feed import PULL_AUTHORS_CACHE_KEY, read_feed, trim_feed
+from notifications.models import Notification
+from notifications.outbox import drain_outbox
+from .models import Post, Comment, Like, FeedEntry, LikeCounterShard, TrendingScore
+from .response_cache import get_generation, post_generation_key, response_cache_key
+from .search import SQLITE_TRIGGERS
+from .serializers import PostSerializer
+from .trending import refresh_trending
+from .views import PostViewSet
+
+User = get_user_model()
+
+
+class FeedTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.reader = User.objects.create_user(username='reader', password='password')
+        self.reader.following.add(self.author)
+        self.client.force_authenticate(user=self.reader)
+        self.feed_url = reverse('user_feed')
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.assertTrue(FeedEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertFalse(FeedEntry.objects.filter(owner=self.author).exists())
+
+    def test_follow_backfills_and_unfollow_removes_posts(self):
+        other = User.objects.create_user(username='other', password='password')
+        post = Post.objects.create(author=other, title='Earlier', content='Post')
+        self.reader.following.add(other)
+        self.assertTrue(FeedEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.reader.following.remove(other)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.reader, post=post).exists())
+
+    def test_feed_returns_newest_posts_first(self):
+        first = Post.objects.create(author=self.author, title='First', content='Post')
+        second = Post.objects.create(author=self.author, title='Second', content='Post')
+        response = self.client.get(self.feed_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post['id'] for post in response.data['feed']], [second.id, first.id])
+
+        response = self.client.get(self.feed_url, {'before': second.id})
+        self.assertEqual([post['id'] for post in response.data['feed']], [first.id])
+
+    def test_trim_feed_keeps_newest_entries(self):
+        posts = [Post.objects.create(author=self.author, title=str(i), content='Post') for i in range(5)]
+        self.assertEqual(trim_feed(self.reader.id, max_length=2), 3)
+        kept = FeedEntry.objects.filter(owner=self.reader).values_list('post_id', flat=True)
+        self.assertEqual(sorted(kept), [posts[3].id, posts[4].id])
+
+
+@override_settings(FEED_FANOUT_FOLLOWER_THRESHOLD=2)
+class HybridFeedTests(APITestCase):
+    def setUp(self):
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+        self.celebrity = User.objects.create_user(username='celebrity', password='password')
+        self.author = User.objects.create_user(username='author', password='password')
+        self.reader = User.objects.create_user(username='reader', password='password')
+        self.fan = User.objects.create_user(username='fan', password='password')
+        self.reader.following.add(self.celebrity, self.author)
+        self.fan.following.add(self.celebrity)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.celebrity.refresh_from_db()
+
+    def tearDown(self):
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+
+    def test_high_follower_posts_are_not_fanned_out(self):
+        post = Post.objects.create(author=self.celebrity, title='Big', content='News')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+    def test_pulled_posts_are_merged_in_order(self):
+        first = Post.objects.create(author=self.author, title='First', content='Post')
+        second = Post.objects.create(author=self.celebrity, title='Second', content='Post')
+        third = Post.objects.create(author=self.author, title='Third', content='Post')
+        self.assertEqual(read_feed(self.reader), [third, second, first])
+        self.assertEqual(read_feed(self.reader, before=third.id, limit=1), [second])
+
+    @override_settings(FEED_PULL_MAX_SOURCES=1, FEED_PULL_PER_SOURCE_LIMIT=2)
+    def test_capped_sources_resume_where_the_page_stopped(self):
+        star = User.objects.create_user(username='star', password='password')
+        self.reader.following.add(star)
+        self.fan.following.add(star)
+        star.refresh_from_db()
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+        posts = [Post.objects.create(author=author, title=str(i), content='Post')
+                 for i, author in enumerate([self.celebrity, star, self.author, star] * 4)]
+
+        seen, before = [], None
+        while page := read_feed(self.reader, before=before, limit=5):
+            self.assertLessEqual(len(page), 5)
+            seen += page
+            before = page[-1].id
+        self.assertEqual(seen, posts[::-1])
+
+
+# Exercises the layers below the anonymous response cache
+@override_settings(ANON_RESPONSE_CACHE_TIMEOUT=0)
+class PostPaginationTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.posts = [Post.objects.create(author=self.author, title=str(i), content='Post') for i in range(12)]
+        self.list_url = reverse('post-list')
+
+    def test_cursor_pages_are_stable_under_inserts(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [post.id for post in reversed(self.posts[2:])])
+
+        Post.objects.create(author=self.author, title='New', content='Post')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [self.posts[1].id, self.posts[0].id])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([post['id'] for post in response.data['results']],
+                         [post.id for post in reversed(self.posts[2:])])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.list_url, {'cursor': 'cD1nYXJiYWdl'})  # p=garbage
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# Exercises the layers below the anonymous response cache
+@override_settings(ANON_RESPONSE_CACHE_TIMEOUT=0)
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.list_url = reverse('post-list')
+
+    def _search(self, text, **params):
+        response = self.client.get(self.list_url, {'search': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def _titles(self, text):
+        return [post['title'] for post in self._search(text).data['results']]
+
+    def test_words_phrases_and_prefixes(self):
+        Post.objects.create(author=self.author, title='Running shoes', content='Great for a marathon')
+        Post.objects.create(author=self.author, title='Shoes', content='Shoes for running marathons')
+        Post.objects.create(author=self.author, title='Cooking', content='A marathon of pasta')
+
+        self.assertEqual(sorted(self._titles('run')), ['Running shoes', 'Shoes'])
+        self.assertEqual(self._titles('"running shoes"'), ['Running shoes'])
+        self.assertEqual(sorted(self._titles('mara*')), ['Cooking', 'Running shoes', 'Shoes'])
+        self.assertEqual(self._titles('pasta mara*'), ['Cooking'])
+        # Whole words only: no substring matches inside other words
+        self.assertEqual(self._titles('hoe'), [])
+        self.assertEqual(self._titles('"" *'), [])
+
+    def test_title_matches_rank_first_and_index_follows_edits(self):
+        in_content = Post.objects.create(author=self.author, title='Notes', content='About django')
+        in_title = Post.objects.create(author=self.author, title='Django', content='Notes')
+        self.assertEqual(self._titles('django'), ['Django', 'Notes'])
+
+        in_content.content = 'About flask'
+        in_content.save()
+        in_title.delete()
+        self.assertEqual(self._titles('django'), [])
+        self.assertEqual(self._titles('flask'), ['Notes'])
+
+    def test_ranked_results_are_cursor_paginated(self):
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='search me') for i in range(12)]
+        response = self._search('search')
+        seen = [post['id'] for post in response.data['results']]
+        response = self.client.get(response.data['next'])
+        seen += [post['id'] for post in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(post.id for post in posts))
+
+    def test_search_uses_the_configured_pagination_class(self):
+        Post.objects.create(author=self.author, title='Notes', content='About django')
+        Post.objects.create(author=self.author, title='Django', content='Notes')
+        with mock.patch.object(PostViewSet, 'pagination_class', PageNumberPagination):
+            body = self._search('django').data
+        self.assertEqual(body['count'], 2)
+        self.assertEqual([post['title'] for post in body['results']], ['Django', 'Notes'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Only SQLite keeps the index in step with triggers')
+    def test_migrate_restores_triggers_a_table_rebuild_dropped(self):
+        # What SQLite's schema editor does to triggers when it copies posts_post into a new table
+        with connection.cursor() as cursor:
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        Post.objects.create(author=self.author, title='Written', content='between the rebuild and migrate')
+        self.assertEqual(self._titles('rebuild'), [])
+
+        call_command('migrate', verbosity=0)
+        self.assertEqual(self._titles('rebuild'), ['Written'])
+        Post.objects.create(author=self.author, title='Later', content='after the rebuild')
+        self.assertEqual(sorted(self._titles('rebuild')), ['Later', 'Written'])
+
+
+class TrendingTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.url = reverse('post-trending')
+
+    def _post(self, title, age_hours=0, likes=0, comments=0):
+        post = Post.objects.create(author=self.author, title=title, content='Post')
+        Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(hours=age_hours),
+                                               likes_count=likes, comments_count=comments)
+        return post
+
+    def _trending(self):
+        return [post['title'] for post in self.client.get(self.url).data['results']]
+
+    def test_engagement_decays_with_age(self):
+        self._post('old popular', age_hours=12, likes=20)
+        self._post('new quiet', likes=2)
+        self._post('new popular', likes=10, comments=2)
+        self._post('expired', age_hours=72, likes=1000)
+        self.assertEqual(refresh_trending(), (3, 0))
+        self.assertEqual(self._trending(), ['new popular', 'old popular', 'new quiet'])
+
+    def test_refresh_only_rescores_changed_posts(self):
+        quiet = self._post('quiet', likes=1)
+        self._post('steady', likes=5)
+        refresh_trending()
+        self.assertEqual(refresh_trending(), (0, 0))
+
+        Post.objects.filter(pk=quiet.pk).update(likes_count=50)
+        self.assertEqual(refresh_trending(), (1, 0))
+        self.assertEqual(self._trending(), ['quiet', 'steady'])
+
+        Post.objects.filter(pk=quiet.pk).update(created_at=timezone.now() - timedelta(hours=72))
+        TrendingScore.objects.filter(post=quiet).update(post_created_at=timezone.now() - timedelta(hours=72))
+        self.assertEqual(refresh_trending(), (0, 1))
+
+    def test_trending_is_cursor_paginated(self):
+        posts = [self._post(str(i), likes=i) for i in range(12)]
+        call_command('refresh_trending', once=True, stdout=StringIO())
+        response = self.client.get(self.url)
+        ids = [post['id'] for post in response.data['results']]
+        ids += [post['id'] for post in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+
+# Exercises the layers below the anonymous response cache
+@override_settings(ANON_RESPONSE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.list_url = reverse('post-list')
+        self.detail_url = reverse('post-detail', args=[self.post.pk])
+
+    def test_unchanged_list_is_not_modified_without_a_query(self):
+        response = self.client.get(self.list_url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # Likes do not touch updated_at but still change the ETag
+        other = User.objects.create_user(username='other', password='password')
+        self.client.force_authenticate(user=other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', args=[self.post.pk]))
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_username_changes_change_list_and_detail_etags(self):
+        list_etag = self.client.get(self.list_url)['ETag']
+        detail_etag = self.client.get(self.detail_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.json()['results'][0]['author'], 'renamed')
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.json()['author'], 'renamed')
+
+    def test_detail_honours_if_modified_since(self):
+        response = self.client.get(self.detail_url)
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Post.objects.filter(pk=self.post.pk).update(title='Edited', updated_at=self.post.updated_at + timedelta(seconds=5))
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Edited')
+
+        response = self.client.get(reverse('post-detail', args=[self.post.pk + 1]), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_new_comment_changes_comment_list_etag(self):
+        url = reverse('comment-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, content='First')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   CACHE_SINGLE_PROCESS=False, LIKE_SHARDING_RATE_THRESHOLD=1)
+class ProcessLocalCacheTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+
+    def test_features_needing_a_shared_cache_are_off(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['social_media_api.W001'])
+        for url in (reverse('post-list'), reverse('post-detail', args=[self.post.pk])):
+            first = self.client.get(url)
+            self.assertFalse(first.has_header('ETag'))
+            with self.assertNumQueries(1):  # Not served from the response cache
+                self.client.get(url)
+
+        self.client.force_authenticate(user=self.author)
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.sharded_likes)
+
+        with self.settings(CACHE_SINGLE_PROCESS=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+# Exercises the layers below the anonymous response cache
+@override_settings(ANON_RESPONSE_CACHE_TIMEOUT=0)
+class RepresentationCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Ünïcode') for i in range(3)]
+        self.list_url = reverse('post-list')
+
+    def tearDown(self):
+        cache.clear()
+
+    def _expected(self):
+        posts = Post.objects.order_by('-created_at', '-id')
+        return PostSerializer(posts, many=True).data
+
+    def test_cached_fragments_match_the_serializer(self):
+        # Light page, then the misses with their authors
+        with self.assertNumQueries(2):
+            first = self.client.get(self.list_url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.list_url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json()['results'], self._expected())
+
+    def test_pages_go_through_the_accepted_renderer(self):
+        response = self.client.get(self.list_url, HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  "next": null', response.content)
+        self.assertEqual(response.json()['results'], self._expected())
+        self.assertEqual([post['id'] for post in response.data['results']], [post['id'] for post in self._expected()])
+
+        with mock.patch.object(FastJSONRenderer, 'render', return_value=b'{}'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.get(self.list_url)
+
+    def test_edits_counters_and_username_changes_are_never_stale(self):
+        self.client.get(self.list_url)
+        post = self.posts[0]
+        post.title = 'Edited'
+        post.save()
+        Post.objects.filter(pk=self.posts[1].pk).update(likes_count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+
+        results = self.client.get(self.list_url).json()['results']
+        self.assertEqual(results, self._expected())
+        self.assertEqual({result['author'] for result in results}, {'renamed'})
+
+
+class AnonymousResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.list_url = reverse('post-list')
+        self.detail_url = reverse('post-detail', args=[self.post.pk])
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        first = self.client.get(self.list_url, {'search': 'hello', 'b': '1'})
+        with self.assertNumQueries(0):
+            second = self.client.get(self.list_url, {'b': '1', 'search': 'hello'})
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, {'b': '1', 'search': 'hello'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Authenticated users always get a live response (post fragments are still cached)
+        self.client.force_authenticate(user=self.author)
+        with self.assertNumQueries(1):
+            self.client.get(self.list_url, {'search': 'hello', 'b': '1'})
+
+    def test_writes_bump_the_generation(self):
+        self.client.get(self.detail_url)
+        other = Post.objects.create(author=self.author, title='Other', content='Post')
+        self.client.get(reverse('post-detail', args=[other.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, content='Hi')
+            Post.objects.filter(pk=self.post.pk).update(comments_count=1)
+        self.assertEqual(self.client.get(self.detail_url).json()['comments_count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('post-detail', args=[other.pk]))
+
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.author, post=self.post)
+            Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        self.assertEqual(self.client.get(self.detail_url).json()['likes_count'], 1)
+        # Likes leave list pages to expire
+        with self.assertNumQueries(0):
+            results = self.client.get(self.list_url).json()['results']
+        self.assertEqual(results[1]['likes_count'], 0)
+
+    def test_author_renames_bump_the_generations(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        self.assertEqual(self.client.get(self.detail_url).json()['author'], 'renamed')
+        self.assertEqual({post['author'] for post in self.client.get(self.list_url).json()['results']}, {'renamed'})
+
+    @override_settings(ANON_RESPONSE_CACHE_TIMEOUT=0.01)
+    def test_stale_entry_is_served_while_another_worker_rebuilds(self):
+        first = self.client.get(self.detail_url)
+        time.sleep(0.02)
+        Post.objects.filter(pk=self.post.pk).update(title='Changed')
+        key = response_cache_key(RequestFactory().get(self.detail_url),
+                                 get_generation(post_generation_key(self.post.pk)))
+        cache.add(f'{key}:lock', 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.detail_url).content, first.content)
+        cache.delete(f'{key}:lock')
+        self.assertEqual(self.client.get(self.detail_url).json()['title'], 'Changed')
+
+
+class AuthorWithPostsSerializer(serializers.ModelSerializer):
+    # Same shape as AuthorSerializer.books in advanced-api-project
+    posts = PostSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'posts']
+
+
+class QueryPlanTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+
+    def _add_comments(self, count):
+        for i in range(count):
+            commenter = User.objects.create_user(username=f'commenter{Comment.objects.count()}', password='password')
+            Comment.objects.create(post=self.post, author=commenter, content=str(i))
+
+    def test_comment_pages_cost_the_same_however_many_authors(self):
+        url = reverse('comment-list')
+        for count in (1, 8):
+            self._add_comments(count)
+            with self.assertNumQueries(1):  # The page with its authors
+                response = self.client.get(url)
+            self.assertEqual(len(response.data['results']), Comment.objects.count())
+
+    def test_post_detail_joins_its_author(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('post-detail', args=[self.post.pk]))
+        self.assertEqual(response.data['author'], 'author')
+
+    def test_nested_many_serializers_are_prefetched_with_their_own_plan(self):
+        plan = plan_for(AuthorWithPostsSerializer, User)
+        self.assertEqual(plan.only, {'id', 'username'})
+        self.assertEqual(plan.prefetch['posts'].select, {'author'})
+        self.assertIn('author__username', plan.prefetch['posts'].only)
+
+        other = User.objects.create_user(username='other', password='password')
+        for i in range(3):
+            Post.objects.create(author=other, title=str(i), content='Post')
+        with self.assertNumQueries(2):
+            data = AuthorWithPostsSerializer(plan.apply(User.objects.order_by('id')), many=True).data
+        self.assertEqual([len(user['posts']) for user in data], [1, 3])
+        self.assertEqual(data[1]['posts'][0]['author'], 'other')
+
+
+class CompiledSerializerTests(APITestCase):
+    def test_rows_render_like_the_serializer(self):
+        author = User.objects.create_user(username='author', password='password')
+        posts = [Post.objects.create(author=author, title=f'Post {i}', content='Hello') for i in range(3)]
+        Post.objects.filter(pk=posts[1].pk).update(likes_count=4)
+        queryset = Post.objects.select_related('author').order_by('id')
+        expected = PostSerializer(queryset, many=True).data
+        with self.assertNumQueries(1):
+            rows = compile_serializer(PostSerializer).serialize(queryset)
+        self.assertEqual(rows, expected)
+        self.assertEqual(rows[1]['likes_count'], 4)
+
+    def test_nested_serializers_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(AuthorWithPostsSerializer)
+
+    def test_what_the_compiled_function_would_get_wrong_is_rejected(self):
+        class UpperCaseSerializer(PostSerializer):
+            def to_representation(self, instance):
+                return {name: str(value).upper() for name, value in super().to_representation(instance).items()}
+
+        class LikedSerializer(PostSerializer):
+            liked = serializers.SerializerMethodField()
+
+            class Meta(PostSerializer.Meta):
+                fields = PostSerializer.Meta.fields + ['liked']
+                plan_extra_fields = []
+
+            def get_liked(self, post):
+                return post.likes.filter(user=self.context['request'].user).exists()
+
+        class PropertySerializer(PostSerializer):
+            author_name = serializers.ReadOnlyField(source='author.get_full_name')
+
+            class Meta(PostSerializer.Meta):
+                fields = PostSerializer.Meta.fields + ['author_name']
+
+        class Upper(serializers.CharField):
+            def to_representation(self, value):
+                return super().to_representation(value).upper()
+
+        class UpperTitleSerializer(PostSerializer):
+            title = Upper()
+
+        class IdentSerializer(PostSerializer):
+            ident = serializers.CharField(source='id')
+
+            class Meta(PostSerializer.Meta):
+                fields = PostSerializer.Meta.fields + ['ident']
+
+        for serializer_class in (UpperCaseSerializer, LikedSerializer, PropertySerializer, UpperTitleSerializer,
+                                 IdentSerializer):
+            with self.subTest(serializer_class.__name__), self.assertRaises(ImproperlyConfigured):
+                compile_serializer(serializer_class)
+
+
+class FastJSONTests(APITestCase):
+    def test_renders_the_same_bytes_as_drf(self):
+        data = {
+            'id': uuid.uuid4(), 'at': timezone.now(), 'day': timezone.now().date(), 'price': Decimal('1.50'),
+            'text': 'caf\u00e9 \u2028', 1: [None, True, 2.5],
+        }
+        expected = JSONRenderer().render(data)
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('fell back to JSONRenderer')):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_what_orjson_cannot_write_falls_back_to_drf(self):
+        data = {'big': [2 ** 70, -2 ** 70]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        for value in (float('nan'), float('inf'), -float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                FastJSONRenderer().render({'values': [None, (1.0, value)]})
+
+    def test_json_bodies_are_parsed(self):
+        author = User.objects.create_user(username='author', password='password')
+        self.client.force_authenticate(author)
+        response = self.client.post(reverse('post-list'), {'title': 'Caf\u00e9', 'content': 'Body'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Post.objects.get().title, 'Caf\u00e9')
+
+        response = self.client.post(reverse('post-list'), b'{"title":', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+
+class PostCommentsTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        other = Post.objects.create(author=self.author, title='Other', content='World')
+        Comment.objects.create(post=other, author=self.author, content='Elsewhere')
+        self.comments = [Comment.objects.create(post=self.post, author=self.author, content=str(i)) for i in range(5)]
+
+    def test_comments_of_a_post_are_paged_newest_first(self):
+        url = reverse('post-comments', args=[self.post.pk])
+        with mock.patch.object(KeysetCursorPagination, 'page_size', 2):
+            with self.assertNumQueries(1):
+                first = self.client.get(url)
+            second = self.client.get(first.data['next'])
+        self.assertEqual([comment['content'] for comment in first.data['results']], ['4', '3'])
+        self.assertEqual([comment['content'] for comment in second.data['results']], ['2', '1'])
+        self.assertEqual(first.data['results'][0]['author'], 'author')
+
+    def test_first_page_is_a_range_scan_of_the_post_index(self):
+        plan = Comment.objects.filter(post=self.post).order_by('-created_at', '-id')[:11].explain()
+        self.assertIn('comment_post_created_id_idx', plan)
+
+    def test_missing_or_malformed_posts_are_not_found(self):
+        empty = Post.objects.create(author=self.author, title='Quiet', content='World')
+        self.assertEqual(self.client.get(reverse('post-comments', args=[empty.pk])).data['results'], [])
+        for pk in (empty.pk + 1, 'abc'):
+            response = self.client.get(reverse('post-comments', args=[pk]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.reader = User.objects.create_user(username='reader', password='password')
+        self.post = Post.objects.create(author=self.author, title='Counted', content='Post')
+        self.client.force_authenticate(user=self.reader)
+
+    def test_like_and_comment_counters_follow_writes(self):
+        like_url = reverse('post-like', kwargs={'pk': self.post.pk})
+        self.client.post(like_url)
+        self.client.post(like_url)
+        response = self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'Nice'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['comments_count'], 1)
+
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.client.delete(reverse('comment-detail', kwargs={'pk': Comment.objects.get().pk}))
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_moving_a_comment_moves_its_count(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Post')
+        self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'Nice'})
+        response = self.client.patch(reverse('comment-detail', kwargs={'pk': Comment.objects.get().pk}),
+                                     {'post': other.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.post.comments_count, other.comments_count), (0, 1))
+
+    def test_follow_counters_follow_writes(self):
+        self.client.post(reverse('follow_user', kwargs={'user_id': self.author.pk}))
+        self.client.post(reverse('follow_user', kwargs={'user_id': self.author.pk}))
+        response = self.client.get(reverse('user_profile', kwargs={'pk': self.author.pk}))
+        self.assertEqual(response.data['followers_count'], 1)
+
+        self.client.post(reverse('unfollow_user', kwargs={'user_id': self.author.pk}))
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.following_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Comment.objects.create(post=self.post, author=self.reader, content='Uncounted')
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7)
+        self.reader.following.add(self.author)
+
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 1))
+        self.assertEqual(self.author.followers_count, 1)
+
+
+@override_settings(LIKE_SHARDING_RATE_THRESHOLD=2, LIKE_SHARD_TOTAL_CACHE_TIMEOUT=0)
+class ShardedCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.post = Post.objects.create(author=self.author, title='Viral', content='Post')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='password') for i in range(4)]
+
+    def like_as(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+
+    def test_hot_post_switches_to_shards_and_keeps_total(self):
+        for fan in self.fans:
+            self.like_as(fan)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.sharded_likes)
+        self.assertTrue(LikeCounterShard.objects.filter(post=self.post).exists())
+        self.assertEqual(get_like_count(self.post), 4)
+
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        response = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.data['likes_count'], 3)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Post.likes_count: repaired 0 rows', out.getvalue())
+
+    def test_reconcile_never_stores_a_negative_base_count(self):
+        Post.objects.filter(pk=self.post.pk).update(sharded_likes=True, likes_count=3)
+        LikeCounterShard.objects.create(post=self.post, shard=0, count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+
+class ReactionBatchTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password')
+        self.reader = User.objects.create_user(username='reader', password='password')
+        self.first = Post.objects.create(author=self.author, title='First', content='Post')
+        self.second = Post.objects.create(author=self.author, title='Second', content='Post')
+        Like.objects.create(user=self.reader, post=self.second)
+        self.client.force_authenticate(user=self.reader)
+        self.url = reverse('post-reactions')
+
+    def test_operations_are_applied_in_order(self):
+        operations = [
+            {'post': self.first.pk, 'action': 'like'},
+            {'post': self.first.pk, 'action': 'like'},
+            {'post': self.second.pk, 'action': 'unlike'},
+            {'post': self.second.pk, 'action': 'unlike'},
+            {'post': 0, 'action': 'like'},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['post liked', 'post already liked', 'post unliked', 'not liked', 'not found'])
+        self.assertEqual(list(Like.objects.filter(user=self.reader).values_list('post_id', flat=True)),
+                         [self.first.pk])
+        self.assertEqual(drain_outbox(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.likes_count, 1)
+
+    def test_likes_inserted_concurrently_are_counted_once(self):
+        bulk_create = Like.objects.bulk_create
+
+        def racing_bulk_create(likes, **kwargs):
+            # A single-post like commits between the batch's read and its INSERT
+            Like.objects.create(user=self.reader, post=self.first)
+            Post.objects.filter(pk=self.first.pk).update(likes_count=F('likes_count') + 1)
+            return bulk_create(likes, **kwargs)
+
+        with mock.patch.object(Like.objects, 'bulk_create', side_effect=racing_bulk_create):
+            response = self.client.post(self.url, {'operations': [{'post': self.first.pk, 'action': 'like'}]},
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.likes_count, 1)
+        self.assertEqual(drain_outbox(), 0)
+
+    def test_invalid_action_is_rejected(self):
+        response = self.client.post(self.url, {'operations': [{'post': self.first.pk, 'action': 'love'}]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,126 @@
+"""
+Trending posts.
+
+A post's trending weight is its engagement decayed exponentially with age:
+
+    (1 + likes * LIKE_WEIGHT + comments * COMMENT_WEIGHT) * 2 ** (-age / HALF_LIFE)
+
+Taking the log and dropping the term every post shares (the current time)
+leaves a score that only depends on the post's own counters and creation
+time:
+
+    log2(1 + engagement) + (created_at - EPOCH) / HALF_LIFE
+
+so ordering by the stored score is the same as ordering by the decayed weight
+at any moment, and a score only has to be recomputed when the post's counters
+move. refresh_trending picks those posts up with one query against the
+counters snapshot kept in TrendingScore and scores them in NumPy batches.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import LikeCounterShard, Post, TrendingScore
+
+TRENDING_DEFAULTS = {
+    # Only posts younger than this are ranked
+    'TRENDING_WINDOW_HOURS': 48,
+    # Engagement loses half its weight every this many hours
+    'TRENDING_HALF_LIFE_HOURS': 6,
+    'TRENDING_LIKE_WEIGHT': 1.0,
+    'TRENDING_COMMENT_WEIGHT': 3.0,
+    # Posts read, scored and upserted per batch
+    'TRENDING_BATCH_SIZE': 5000,
+}
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def trending_setting(name):
+    return getattr(settings, name, TRENDING_DEFAULTS[name])
+
+
+def window_start(now=None):
+    return (now or timezone.now()) - timedelta(hours=trending_setting('TRENDING_WINDOW_HOURS'))
+
+
+def decayed_scores(likes, comments, created_ts):
+    """Scores for arrays of like counts, comment counts and creation timestamps (seconds)."""
+    engagement = (likes * trending_setting('TRENDING_LIKE_WEIGHT')
+                  + comments * trending_setting('TRENDING_COMMENT_WEIGHT'))
+    half_life = trending_setting('TRENDING_HALF_LIFE_HOURS') * 3600.0
+    return np.log2(1.0 + np.maximum(engagement, 0)) + (created_ts - EPOCH.timestamp()) / half_life
+
+
+def _score_batch(rows, now):
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    created = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    likes = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+    comments = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+
+    # Hot posts keep part of their like count in LikeCounterShard rows
+    sharded = [row[0] for row in rows if row[4]]
+    if sharded:
+        totals = dict(LikeCounterShard.objects.filter(post_id__in=sharded)
+                      .values('post_id').annotate(total=Sum('count')).values_list('post_id', 'total'))
+        extra = np.fromiter((totals.get(row[0], 0) if row[4] else 0 for row in rows),
+                            dtype=np.float64, count=len(rows))
+        likes = likes + extra
+
+    scores = decayed_scores(likes, comments, created)
+    TrendingScore.objects.bulk_create(
+        [TrendingScore(post_id=int(post_id), score=float(score), likes_count=row[2], comments_count=row[3],
+                       post_created_at=row[1], scored_at=now)
+         for post_id, score, row in zip(ids, scores, rows)],
+        update_conflicts=True,
+        unique_fields=['post'],
+        update_fields=['score', 'likes_count', 'comments_count', 'scored_at'],
+    )
+
+
+def refresh_trending(full=False, now=None):
+    """
+    Rescore recent posts whose counters changed since they were last scored
+    (every recent post when ``full``) and drop posts that left the window.
+    Returns ``(scored, dropped)``.
+    """
+    now = now or timezone.now()
+    since = window_start(now)
+    batch_size = trending_setting('TRENDING_BATCH_SIZE')
+
+    posts = Post.objects.filter(created_at__gte=since)
+    if not full:
+        # Sharded posts are always rescored: their shard totals are not in the snapshot
+        posts = posts.filter(
+            Q(trending__isnull=True)
+            | ~Q(likes_count=F('trending__likes_count'))
+            | ~Q(comments_count=F('trending__comments_count'))
+            | Q(sharded_likes=True)
+        )
+    rows = posts.order_by().values_list('id', 'created_at', 'likes_count', 'comments_count', 'sharded_likes')
+
+    scored = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            _score_batch(batch, now)
+            scored += len(batch)
+            batch = []
+    if batch:
+        _score_batch(batch, now)
+        scored += len(batch)
+
+    dropped, _ = TrendingScore.objects.filter(post_created_at__lt=since).delete()
+    return scored, dropped
+
+
+def trending_posts(queryset=None, now=None):
+    """Posts in the trending window annotated with ``trending_score``, highest first."""
+    queryset = queryset if queryset is not None else Post.objects.all()
+    return (queryset.filter(trending__post_created_at__gte=window_start(now))
+            .annotate(trending_score=F('trending__score'))
+            .order_by('-trending_score', '-id'))
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet
+from .views import PostViewSet, CommentViewSet, user_feed
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -8,8 +8,6 @@ router.register(r'comments', CommentViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('posts/<int:pk>/like/', PostViewSet.as_view({'post': 'like'})),
-    path('posts/<int:pk>/unlike/', PostViewSet.as_view({'post': 'unlike'})),
-    path('feed/', include('posts.urls')),
+    path('feed/', user_feed, name='user_feed'),
 
 ]
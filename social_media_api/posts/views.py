@@ -1,68 +1,102 @@
-from rest_framework import viewsets, permissions
-
-from social_media_api.notifications.models import Notification
-from .models import Post, Comment
-from .serializers import PostSerializer, CommentSerializer
-from rest_framework import viewsets, permissions, filters
-from rest_framework import status, permissions
-from rest_framework.decorators import action
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Sum
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework import viewsets
-from .models import Post, Like
-from .serializers import LikeSerializer
 
-dd=Post.objects.filter(author__in=following_users).order_by
+from notifications.outbox import enqueue, enqueue_many
+from social_media_api.conditional import ConditionalGetMixin, bump_versions
+from social_media_api.pagination import KeysetCursorPagination, RankedCursorPagination, TrendingCursorPagination
+from social_media_api.query_planning import QueryPlanMixin, plan_for
+from .counters import adjust_like_count, adjust_like_counts, counter_setting, sharded_totals_may_be_stale
+from .feed import read_feed
+from .models import Post, Comment, Like
+from .representations import CachedPostListMixin
+from .response_cache import AnonymousResponseCacheMixin, bump_generations
+from .search import PostSearchFilter
+from .trending import trending_posts
+from .serializers import PostSerializer, CommentSerializer, ReactionBatchSerializer
 
-us=generics.get_object_or_404(Post, pk=pk)
-rs=user=request.user, post=post)Like.objects.get_or_create(user=request.user, post=post)
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
-    serializer_class = PostSerializer
-    permission_classes = [permissionsLike.objects.get_or_create(user=request.user, post=post).IsAuthenticatedOrReadOnly]
-
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
-
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
-    serializer_class = CommentSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+User = get_user_model()
 
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
 
-
-
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(QueryPlanMixin, AnonymousResponseCacheMixin, ConditionalGetMixin, CachedPostListMixin,
+                  viewsets.ModelViewSet):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content']  # Allow filtering by title or content
+    pagination_class = KeysetCursorPagination  # Set to PageNumberPagination for numbered pages
+    filter_backends = [PostSearchFilter]  # Full-text ?search= over title and content, see posts.search
+    search_fields = ['title', 'content']
+    validator_related_models = [User]  # The author's username
+
+    @property
+    def paginator(self):
+        # Keyset cursors page over the queryset's own order: search results best match first, trending
+        # posts highest score first, everything else newest first. Other pagination classes are used
+        # as they are, over the order the search filter and trending_posts give.
+        if not hasattr(self, '_paginator'):
+            paginator_class = self.pagination_class
+            if paginator_class is not None and issubclass(paginator_class, KeysetCursorPagination):
+                if self.action == 'trending':
+                    paginator_class = TrendingCursorPagination
+                elif self.action == 'list' and PostSearchFilter().get_search_text(self.request):
+                    paginator_class = RankedCursorPagination
+            self._paginator = paginator_class() if paginator_class is not None else None
+        return self._paginator
+
+    def get_validator_aggregates(self):
+        # Like and comment counters change without touching updated_at
+        return {**super().get_validator_aggregates(), 'likes': Sum('likes_count'), 'comments': Sum('comments_count')}
+
+    def get_etag(self, values):
+        if sharded_totals_may_be_stale():
+            # Sharded like totals live outside the post row; let them expire with the cached total
+            values = {**values, 'window': int(time.time() // max(counter_setting('LIKE_SHARD_TOTAL_CACHE_TIMEOUT'), 1))}
+        return super().get_etag(values)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-
-
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all()
-    serializer_class = PostSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        # Scores are maintained by refresh_trending, see posts.trending
+        queryset = trending_posts(self.get_queryset())
+        response = self.paginate_posts(queryset)
+        if response is not None:
+            return response
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'], serializer_class=CommentSerializer)
+    def comments(self, request, pk=None):
+        # Keyset pages over the (post, -created_at, -id) index; the post itself is only read to tell
+        # an empty page from a missing post
+        try:
+            queryset = Comment.objects.filter(post_id=pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound()
+        page = self.paginate_queryset(plan_for(CommentSerializer, Comment).apply(queryset))
+        if not page and not Post.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
         post = self.get_object()
         user = request.user
-        like, created = Like.objects.get_or_create(user=user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=user, post=post)
+            if created:
+                adjust_like_count(post, 1)
+                # Queue the notification; drain_notifications creates it off the request path
+                enqueue(post.author_id, user.pk, 'liked your post', post)
         if created:
-            # Create a notification
-            Notification.objects.create(
-                recipient=post.author,
-                actor=user,
-                verb='liked your post',
-                target=post
-            )
             return Response({'status': 'post liked'}, status=status.HTTP_201_CREATED)
         else:
             return Response({'status': 'post already liked'}, status=status.HTTP_200_OK)
@@ -71,19 +105,110 @@ class PostViewSet(viewsets.ModelViewSet):
     def unlike(self, request, pk=None):
         post = self.get_object()
         user = request.user
-        try:
-            like = Like.objects.get(user=user, post=post)
-            like.delete()
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(user=user, post=post).delete()
+            if deleted:
+                adjust_like_count(post, -1)
+        if deleted:
             return Response({'status': 'post unliked'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            return Response({'status': 'not liked'}, status=status.HTTP_400_BAD_REQUEST)
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from .models import Post
+        return Response({'status': 'not liked'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def _insert_likes(self, user, posts):
+        """Like ``posts`` with one INSERT; returns the posts whose like was inserted by this call."""
+        if not posts:
+            return []
+        likes = [Like(user=user, post=post) for post in posts]
+        # A concurrent like of the same post wins the conflict; it is told apart by its created_at
+        Like.objects.bulk_create(likes, ignore_conflicts=True)
+        stored = dict(Like.objects.filter(user=user, post__in=posts).values_list('post_id', 'created_at'))
+        return [like.post for like in likes if stored.get(like.post_id) == like.created_at]
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def reactions(self, request):
+        """
+        Apply a batch of like/unlike operations with one INSERT and one DELETE.
+
+        Operations are replayed in order against the current likes of the user,
+        so the per-operation statuses match what the single-post endpoints
+        would have answered, and only the final state of each post is written.
+        """
+        serializer = ReactionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        user = request.user
+
+        post_ids = {operation['post'] for operation in operations}
+        posts = Post.objects.only('id', 'author_id', 'likes_count', 'sharded_likes').in_bulk(post_ids)
+        with transaction.atomic():
+            # Locked, so a concurrent unlike cannot delete (and count) the same rows
+            initially_liked = set(Like.objects.select_for_update().filter(user=user, post_id__in=posts)
+                                  .values_list('post_id', flat=True))
+
+            liked = set(initially_liked)
+            results = []
+            for operation in operations:
+                post_id = operation['post']
+                if post_id not in posts:
+                    results.append({'post': post_id, 'status': 'not found'})
+                elif operation['action'] == 'like':
+                    results.append({'post': post_id,
+                                    'status': 'post already liked' if post_id in liked else 'post liked'})
+                    liked.add(post_id)
+                else:
+                    results.append({'post': post_id, 'status': 'post unliked' if post_id in liked else 'not liked'})
+                    liked.discard(post_id)
+
+            to_unlike = [posts[post_id] for post_id in initially_liked - liked]
+            to_like = self._insert_likes(user, [posts[post_id] for post_id in liked - initially_liked])
+            if to_like:
+                adjust_like_counts(to_like, 1)
+                # bulk_create sends no post_save
+                bump_generations([post.pk for post in to_like], lists=False)
+                bump_versions([Post])
+                enqueue_many([(post.author_id, user.pk, 'liked your post', post) for post in to_like])
+            if to_unlike:
+                Like.objects.filter(user=user, post__in=to_unlike).delete()
+                adjust_like_counts(to_unlike, -1)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class CommentViewSet(QueryPlanMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.all().order_by('-created_at')
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetCursorPagination
+    validator_related_models = [User]  # The author's username
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        comment = serializer.save(author=self.request.user)
+        Post.objects.filter(pk=comment.post_id).update(comments_count=F('comments_count') + 1)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Read the current post under a row lock, so concurrent moves of the same comment count once each
+        old_post_id = (Comment.objects.select_for_update()
+                       .values_list('post_id', flat=True).get(pk=serializer.instance.pk))
+        comment = serializer.save()
+        if comment.post_id != old_post_id:
+            Post.objects.filter(pk=old_post_id, comments_count__gt=0).update(comments_count=F('comments_count') - 1)
+            Post.objects.filter(pk=comment.post_id).update(comments_count=F('comments_count') + 1)
+            bump_generations([old_post_id])  # post_save only expires the new post
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post_id = instance.post_id
+        instance.delete()
+        Post.objects.filter(pk=post_id, comments_count__gt=0).update(comments_count=F('comments_count') - 1)
+
 
 @api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
 def user_feed(request):
-    followed_users = request.user.following.all()
-    feed_posts = Post.objects.filter(author__in=followed_users).order_by('-created_at')
-    # You can serialize the posts if necessary
-    return Response({"feed": [post.title for post in feed_posts]})
+    # Read the materialized timeline instead of joining across everyone the user follows
+    before = request.query_params.get('before')
+    if before is not None and not before.isdigit():
+        return Response({"before": "Must be a post id."}, status=status.HTTP_400_BAD_REQUEST)
+    posts = read_feed(request.user, before=before)
+    serializer = PostSerializer(posts, many=True)
+    return Response({"feed": serializer.data})
@@ -0,0 +1,37 @@
+"""
+Whether the default cache is shared by every worker.
+
+Conditional GET version counters, anonymous response cache generations and
+rebuild locks, cached unread badge counts and like-rate counters are only
+correct when every process reads and writes the same cache: a counter bumped
+in one worker's local-memory cache is never seen by the others, which keep
+answering from their own copy indefinitely. Those features turn themselves off
+on a process-local backend (local-memory or dummy), and ``check_shared_cache``
+reports it, unless CACHE_SINGLE_PROCESS vouches that a single process serves
+every request, as under runserver or the test runner.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias=DEFAULT_CACHE_ALIAS):
+    if getattr(settings, 'CACHE_SINGLE_PROCESS', False):
+        return True
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [checks.Warning(
+        f'The default cache ({type(caches[DEFAULT_CACHE_ALIAS]).__name__}) is private to each process.',
+        hint='Point CACHES at Redis or Memcached. Conditional GET, the anonymous response cache, cached unread '
+             'counts and automatic like sharding stay off until then; set CACHE_SINGLE_PROCESS = True only if '
+             'one process serves every request.',
+        id='social_media_api.W001',
+    )]
@@ -0,0 +1,157 @@
+"""
+Read-only ModelSerializers compiled to row functions.
+
+``compile_serializer(PostSerializer)`` inspects the serializer's fields once
+and generates a function turning a ``values_list()`` tuple into the same
+dict the serializer would produce, without DRF's per-field attribute lookup
+and ``to_representation`` dispatch. Fields whose representation is the value
+read from the database (integers, strings, booleans, foreign key ids) are
+copied straight from the tuple; other fields (dates, decimals...) still call
+their bound ``to_representation``. A copy is only made when the field class
+keeps its base ``to_representation`` and the column has the matching type;
+string and integer fields over other columns or with a custom
+``to_representation`` are rejected.
+
+Method fields are called with a lightweight stand-in for the instance holding
+the primary key and the columns listed in ``Meta.plan_extra_fields`` (see
+query_planning), on a serializer without context. Everything the compiled
+function would get wrong raises ImproperlyConfigured when compiling instead:
+a ``to_representation`` override, method fields reading ``self.context``,
+sources that are not model fields (properties, methods, to-many relations),
+nested serializers and other ``source='*'`` fields.
+"""
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import fields, relations, serializers
+from rest_framework.settings import api_settings
+
+# Fields whose to_representation returns the database value unchanged, with the internal types of the
+# model fields that value may come from (None: any column that is not a relation)
+INTEGER_TYPES = {
+    'IntegerField', 'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField', 'PositiveBigIntegerField',
+    'PositiveSmallIntegerField', 'AutoField', 'BigAutoField', 'SmallAutoField',
+}
+PASSTHROUGH_FIELDS = {
+    fields.ReadOnlyField: None,
+    fields.CharField: {'CharField', 'TextField', 'SlugField'},
+    # Before IntegerField, which it subclasses
+    fields.BigIntegerField: INTEGER_TYPES,
+    fields.IntegerField: INTEGER_TYPES,
+    fields.BooleanField: {'BooleanField'},
+    relations.PrimaryKeyRelatedField: {'ForeignKey', 'OneToOneField'},
+}
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class, values_fields, row_to_dict):
+        self.serializer_class = serializer_class
+        self.values_fields = values_fields
+        self.row_to_dict = row_to_dict
+
+    def serialize(self, queryset):
+        """Representations of every row of ``queryset``, in order."""
+        row_to_dict = self.row_to_dict
+        return [row_to_dict(row) for row in queryset.values_list(*self.values_fields)]
+
+    def iterator(self, queryset, chunk_size):
+        """Representations of the rows of ``queryset``, fetched ``chunk_size`` at a time."""
+        row_to_dict = self.row_to_dict
+        for row in queryset.values_list(*self.values_fields).iterator(chunk_size=chunk_size):
+            yield row_to_dict(row)
+
+
+def _column(values_fields, path):
+    if path not in values_fields:
+        values_fields.append(path)
+    return values_fields.index(path)
+
+
+def _source_field(serializer_class, name, model, source_attrs):
+    # values_list() reads model fields only, and one row per instance
+    for position, attr in enumerate(source_attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            field = None
+        last = position == len(source_attrs) - 1
+        if field is None or field.many_to_many or field.one_to_many or not (last or field.is_relation):
+            raise ImproperlyConfigured(
+                f'{serializer_class.__name__}.{name} reads {".".join(source_attrs)}, which is not a model field '
+                f'the compiled serializer can select')
+        model = field.related_model
+    return field
+
+
+def _is_passthrough(field, model_field):
+    """Whether ``field`` would render the column behind ``model_field`` exactly as values_list() returns it."""
+    for base, internal_types in PASSTHROUGH_FIELDS.items():
+        if not isinstance(field, base):
+            continue
+        # Subclasses that override to_representation (even through an intermediate class) do not qualify
+        if type(field).to_representation is not base.to_representation:
+            return False
+        if internal_types is None:
+            return not model_field.is_relation
+        if base is fields.BigIntegerField and getattr(
+                field, 'coerce_to_string', api_settings.COERCE_BIGINT_TO_STRING):
+            return None  # Rendered as a string by its own to_representation
+        if isinstance(field, relations.PrimaryKeyRelatedField) and (
+                field.pk_field is not None or not model_field.target_field.primary_key):
+            return False
+        return model_field.get_internal_type() in internal_types
+    return None
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    if serializer_class.to_representation is not serializers.Serializer.to_representation:
+        raise ImproperlyConfigured(
+            f'{serializer_class.__name__} overrides to_representation, which the compiled serializer would skip')
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    pk_name = model._meta.pk.name
+    extra = getattr(serializer.Meta, 'plan_extra_fields', None)
+    values_fields = [pk_name]
+    namespace = {'SimpleNamespace': SimpleNamespace}
+    items = []
+
+    for position, (name, field) in enumerate(serializer.fields.items()):
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if extra is None:
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{name} is a method field; list the columns it reads in '
+                    f'Meta.plan_extra_fields to compile the serializer')
+            code = getattr(getattr(serializer_class, field.method_name), '__code__', None)
+            if code is not None and 'context' in code.co_names:
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{field.method_name} reads self.context, which is empty when '
+                    f'compiled')
+            attrs = {'pk': 0, pk_name: 0} | {column: _column(values_fields, column) for column in extra}
+            stand_in = ', '.join(f'{attr}=row[{index}]' for attr, index in attrs.items())
+            namespace[f'method_{position}'] = getattr(serializer, field.method_name)
+            items.append(f'{name!r}: method_{position}(SimpleNamespace({stand_in}))')
+            continue
+        if field.source == '*' or isinstance(field, (serializers.BaseSerializer, relations.ManyRelatedField)):
+            raise ImproperlyConfigured(f'{serializer_class.__name__}.{name} cannot be compiled')
+
+        model_field = _source_field(serializer_class, name, model, field.source_attrs)
+        index = _column(values_fields, '__'.join(field.source_attrs))
+        passthrough = _is_passthrough(field, model_field)
+        if passthrough is False:
+            raise ImproperlyConfigured(
+                f'{serializer_class.__name__}.{name} cannot be compiled: {type(field).__name__} does not render '
+                f'{model._meta.object_name}.{".".join(field.source_attrs)} as it is stored')
+        if passthrough:
+            items.append(f'{name!r}: row[{index}]')
+        else:
+            # None is rendered as None without calling the field, as Serializer.to_representation does
+            namespace[f'field_{position}'] = field.to_representation
+            items.append(f'{name!r}: None if row[{index}] is None else field_{position}(row[{index}])')
+
+    source = 'def row_to_dict(row):\n    return {' + ', '.join(items) + '}\n'
+    exec(compile(source, f'<compiled {serializer_class.__name__}>', 'exec'), namespace)
+    return CompiledSerializer(serializer_class, tuple(values_fields), namespace['row_to_dict'])
@@ -0,0 +1,124 @@
+"""
+Conditional GET for model viewsets.
+
+Every table a response is built from has a version number in the cache,
+bumped by ``bump_versions`` once a write to it commits. Lists get a weak
+ETag made of the versions of the viewset's model and its
+``validator_related_models`` (e.g. the author whose username a post shows),
+so validating a list costs one cache read and no query. Details also get
+a Last-Modified header and fold one aggregate over their single row into the
+ETag: its ``updated_at`` and whatever the viewset adds in
+``get_validator_aggregates`` (e.g. denormalized counters that change without
+touching ``updated_at``). A request whose If-None-Match / If-Modified-Since
+still matches is answered with 304 before anything is fetched or serialized.
+
+The counters need a cache every worker shares; on a process-local one (see
+social_media_api.caching) responses carry no validators at all.
+
+Writes that send no post_save/post_delete (queryset.update(), bulk_create())
+must call ``bump_versions`` themselves, or lists keep answering 304.
+
+If-None-Match wins when both are sent (RFC 9110). Clients relying on
+If-Modified-Since alone miss changes that leave ``updated_at`` alone, such
+as a new like; the ETag covers those.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import cache_is_shared
+
+
+def version_key(model):
+    return f'conditional:version:{model._meta.label_lower}'
+
+
+def _new_version():
+    # Above any number handed out before the key was evicted
+    return int(time.time() * 1000)
+
+
+def get_versions(models):
+    """Current version of each of ``models``, in order."""
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(models):
+    """Invalidate validators built from ``models`` once the transaction commits."""
+    keys = {version_key(model) for model in models}
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_version(), None)
+    transaction.on_commit(bump)
+
+
+class ConditionalGetMixin:
+    last_modified_field = 'updated_at'
+    # Models whose columns the serializer shows next to the viewset's own rows
+    validator_related_models = ()
+
+    def get_validator_aggregates(self):
+        return {'last_modified': Max(self.last_modified_field), 'count': Count('pk')}
+
+    def get_validator_values(self, queryset, detail=False):
+        if not detail:
+            return {'versions': get_versions([queryset.model, *self.validator_related_models])}
+        # The row's own columns are read from it, so writes to other rows leave its ETag alone
+        values = queryset.order_by().aggregate(**self.get_validator_aggregates())
+        values['versions'] = get_versions(self.validator_related_models)
+        return values
+
+    def get_etag(self, values):
+        digest = hashlib.md5(repr(sorted(values.items())).encode(), usedforsecurity=False).hexdigest()
+        return 'W/' + quote_etag(digest)
+
+    def conditional_response(self, request, queryset, respond, detail=False):
+        if not cache_is_shared():
+            return respond()  # Other workers would never see this one's version bumps
+        values = self.get_validator_values(queryset, detail=detail)
+        if detail and not values['count']:
+            return respond()  # 404
+        etag = self.get_etag(values)
+        last_modified = values.get('last_modified') and int(values['last_modified'].timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        def respond():
+            return super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+
+        return self.conditional_response(request, self.filter_queryset(self.get_queryset()), respond)
+
+    def retrieve(self, request, *args, **kwargs):
+        def respond():
+            return super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            return respond()  # Malformed lookup, answered with 404 by get_object()
+        return self.conditional_response(request, queryset, respond, detail=True)
@@ -0,0 +1,106 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Newest-first cursor pagination keyed on ``(cursor_field, id)``.
+
+    The opaque cursor holds the key of the last (or first) row that was
+    returned, so every page is a single index range scan with no COUNT and
+    no OFFSET, and rows inserted while a client is paging do not shift pages.
+    """
+    cursor_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        field = self.cursor_field
+        if self.cursor is not None and self.cursor.position is not None:
+            key, pk = self._parse_position(self.cursor.position)
+            if reverse:
+                queryset = queryset.filter(Q(**{f'{field}__gt': key}) | Q(**{field: key, 'id__gt': pk}))
+            else:
+                queryset = queryset.filter(Q(**{f'{field}__lt': key}) | Q(**{field: key, 'id__lt': pk}))
+
+        if reverse:
+            queryset = queryset.order_by(field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def get_ordering(self, request, queryset, view):
+        return (f'-{self.cursor_field}', '-id')
+
+    def encode_key(self, value):
+        return value.isoformat()
+
+    def decode_key(self, text):
+        try:
+            return parse_datetime(text)
+        except ValueError:
+            return None
+
+    def _get_position(self, instance):
+        return f'{self.encode_key(getattr(instance, self.cursor_field))}|{instance.id}'
+
+    def _parse_position(self, position):
+        key, _, pk = position.rpartition('|')
+        key = self.decode_key(key)
+        if key is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return key, int(pk)
+
+
+class TimestampCursorPagination(KeysetCursorPagination):
+    cursor_field = 'timestamp'
+
+
+class RankedCursorPagination(KeysetCursorPagination):
+    """Best-first pages over a ``search_rank`` annotation, ties broken by id."""
+    cursor_field = 'search_rank'
+
+    def encode_key(self, value):
+        return repr(float(value))
+
+    def decode_key(self, text):
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+class TrendingCursorPagination(RankedCursorPagination):
+    cursor_field = 'trending_score'
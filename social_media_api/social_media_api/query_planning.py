@@ -0,0 +1,161 @@
+"""
+Query plans derived from serializer field sources.
+
+QueryPlanMixin reads the fields a viewset's serializer renders and turns
+their sources into ``select_related`` (single-valued relations, e.g.
+``source='author.username'``), ``prefetch_related`` (many-valued relations
+and nested ``many=True`` serializers, each with its own plan) and ``only()``
+(the columns actually read), so a list page costs a fixed number of queries
+however many rows it has.
+
+``only()`` is skipped for a level whose fields cannot all be resolved to
+model fields (method fields, properties, ``source='*'``). A serializer whose
+method fields read known columns can list them in ``Meta.plan_extra_fields``.
+Plans are computed once per serializer and model and logged at INFO.
+"""
+import logging
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+
+logger = logging.getLogger(__name__)
+
+
+class QueryPlan:
+    def __init__(self, model):
+        self.model = model
+        self.select = set()
+        self.prefetch = {}  # relation path -> QueryPlan of the related model
+        self.only = {model._meta.pk.name}
+        self.complete = True  # Every rendered value comes from a known column
+
+    def describe(self):
+        parts = [
+            f'select_related={sorted(self.select)}',
+            f'only={sorted(self.only) if self.complete else None}',
+        ]
+        parts += [f'prefetch {name}: ({plan.describe()})' for name, plan in sorted(self.prefetch.items())]
+        return ' '.join(parts)
+
+    def apply(self, queryset):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        for name, plan in sorted(self.prefetch.items()):
+            queryset = queryset.prefetch_related(
+                Prefetch(name, queryset=plan.apply(plan.model._default_manager.all())))
+        if self.complete:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def _resolve(model, attrs, plan, prefix):
+    """
+    Follow ``attrs`` from ``model`` through single-valued relations, adding
+    them to ``plan.select``. Returns ``(model, path, field)`` for the last
+    attribute, or None when it is not a model field or a many-valued relation
+    sits in the middle of the path.
+    """
+    path = prefix
+    for position, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if position == len(attrs) - 1:
+            return model, path, field
+        if not field.is_relation or field.many_to_many or field.one_to_many:
+            return None
+        path = f'{path}{attr}'
+        plan.select.add(path)
+        plan.only.add(path)
+        path += '__'
+        model = field.related_model
+    return None
+
+
+def _plan_serializer(serializer, model, plan, prefix=''):
+    meta = getattr(serializer, 'Meta', None)
+    extra = getattr(meta, 'plan_extra_fields', None)
+    if extra is not None:
+        plan.only.update(f'{prefix}{name}' for name in extra)
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            _plan_nested(field, nested, model, plan, prefix)
+        elif field.source == '*':
+            if not (isinstance(field, serializers.SerializerMethodField) and extra is not None):
+                plan.complete = False
+        else:
+            _plan_field(field, model, plan, prefix)
+
+
+def _plan_nested(field, nested, model, plan, prefix):
+    if field.source == '*':
+        _plan_serializer(nested, model, plan, prefix)
+        return
+    resolved = _resolve(model, field.source_attrs, plan, prefix)
+    if resolved is None or not resolved[2].is_relation:
+        plan.complete = False
+        return
+    _, path, relation = resolved
+    name = f'{path}{relation.name}'
+    if relation.many_to_many or relation.one_to_many:
+        plan.prefetch[name] = _child_plan(relation, nested)
+    else:
+        plan.select.add(name)
+        plan.only.add(name)
+        _plan_serializer(nested, relation.related_model, plan, f'{name}__')
+
+
+def _child_plan(relation, nested=None):
+    child = QueryPlan(relation.related_model)
+    if relation.one_to_many:
+        # Prefetching a reverse foreign key matches rows on the column pointing back
+        child.only.add(relation.field.name)
+    if nested is not None:
+        _plan_serializer(nested, relation.related_model, child)
+    return child
+
+
+def _plan_field(field, model, plan, prefix):
+    resolved = _resolve(model, field.source_attrs, plan, prefix)
+    if resolved is None:
+        plan.complete = False
+        return
+    _, path, model_field = resolved
+    name = f'{path}{model_field.name}'
+    if isinstance(field, ManyRelatedField) and isinstance(field.child_relation, PrimaryKeyRelatedField):
+        plan.prefetch[name] = _child_plan(model_field)
+    elif not model_field.is_relation or isinstance(field, PrimaryKeyRelatedField):
+        plan.only.add(name)  # A foreign key rendered as its id reads the local column only
+    else:
+        # Related objects rendered whole (e.g. StringRelatedField)
+        plan.complete = False
+        if model_field.many_to_many or model_field.one_to_many:
+            plan.prefetch[name] = QueryPlan(model_field.related_model)
+            plan.prefetch[name].complete = False
+        else:
+            plan.select.add(name)
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class, model):
+    plan = QueryPlan(model)
+    _plan_serializer(serializer_class(), model, plan)
+    logger.info('Query plan for %s on %s: %s', serializer_class.__name__, model.__name__, plan.describe())
+    return plan
+
+
+class QueryPlanMixin:
+    """Apply the query plan of the serializer to ``get_queryset()`` for reads."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method not in ('GET', 'HEAD'):
+            return queryset
+        return plan_for(self.get_serializer_class(), queryset.model).apply(queryset)
@@ -0,0 +1,79 @@
+"""
+JSON renderer and parser backed by orjson when it is installed.
+
+FastJSONRenderer renders straight to bytes with orjson and produces the
+same bytes as DRF's JSONRenderer: datetimes, dates, times, decimals, UUIDs,
+lazy strings and querysets go through DRF's JSONEncoder.default, so their
+format does not change with the library. Requests for indented output
+(the ``indent`` media type parameter or renderer context) and a missing
+orjson fall back to the stdlib encoder of JSONRenderer, as do the
+non-default UNICODE_JSON and COMPACT_JSON settings, integers over 64 bits and
+non-finite floats, which orjson writes as null where JSONRenderer raises
+ValueError (STRICT_JSON) or writes NaN/Infinity. FastJSONParser decodes UTF-8
+bodies with orjson and other charsets with JSONParser.
+"""
+import math
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib path is used instead
+    orjson = None
+
+# Dates and times are left to DRF's encoder, which formats them exactly as JSONRenderer does
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def has_non_finite_float(data):
+    """Whether ``data`` holds a NaN or infinite float anywhere in its dicts, lists and tuples."""
+    pending = [data]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def use_orjson(self, accepted_media_type, renderer_context):
+        return (orjson is not None and not self.ensure_ascii and self.compact
+                and not self.get_indent(accepted_media_type, renderer_context or {}))
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(data, default=encoder.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # Integers over 64 bits, and anything else orjson refuses
+            return super().render(data, accepted_media_type, renderer_context)
+        # orjson writes NaN and infinities as null; only output with a null can hold one
+        if b'null' in ret and has_non_finite_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # U+2028 and U+2029 are escaped for JavaScript, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
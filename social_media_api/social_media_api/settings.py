@@ -42,13 +42,86 @@ INSTALLED_APPS = [
     'accounts',
     'rest_framework.authtoken',
     'posts',
+    'notifications',
 ]
 AUTH_USER_MODEL = 'accounts.CustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson-backed JSON (social_media_api.renderers), same output as DRF's
+    'DEFAULT_RENDERER_CLASSES': [
+        'social_media_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'social_media_api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Materialized home timelines (posts.feed)
+FEED_MAX_LENGTH = 800
+FEED_FANOUT_BATCH_SIZE = 1000
+# Authors at or above this many followers are merged into feeds at read time: at most
+# MAX_SOURCES of them per page, PER_SOURCE_LIMIT posts each
+FEED_FANOUT_FOLLOWER_THRESHOLD = 10000
+FEED_PULL_MAX_SOURCES = 50
+FEED_PULL_PER_SOURCE_LIMIT = 20
+
+# Sharded like counters for hot posts (posts.counters)
+LIKE_COUNTER_SHARDS = 16
+LIKE_SHARDING_RATE_THRESHOLD = 120  # likes per minute
+LIKE_SHARD_TOTAL_CACHE_TIMEOUT = 5
+
+# Outbox rows moved into notifications per transaction by drain_notifications
+NOTIFICATION_OUTBOX_BATCH_SIZE = 500
+# Likes of one target within this many seconds fold into one notification
+NOTIFICATION_AGGREGATION_WINDOW = 3600
+NOTIFICATION_ACTOR_SAMPLE_SIZE = 3
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 60
+NOTIFICATION_BULK_CHUNK_SIZE = 1000
+# Monthly notification storage (notifications.partitions), maintained by a daily rotate_notifications.
+# Notifications older than INBOX_DAYS leave the inbox listing and are marked read so the badge matches it
+NOTIFICATION_INBOX_DAYS = 90
+NOTIFICATION_ARCHIVE_AFTER_MONTHS = 6
+NOTIFICATION_DROP_AFTER_MONTHS = 24
+
+# Friends-of-friends suggestions stored per user by build_follow_suggestions
+FOLLOW_SUGGESTIONS_PER_USER = 20
+# Follow edges fetched per round trip while loading the graph into memory
+FOLLOW_SUGGESTIONS_LOAD_CHUNK_SIZE = 50000
+# Users whose suggestions are replaced per transaction
+FOLLOW_SUGGESTIONS_WRITE_BATCH_SIZE = 1000
+# Seconds a viewer's following set is cached for relationship badges
+FOLLOWING_CACHE_TIMEOUT = 30
+FOLLOWING_CACHE_MAX_SIZE = 5000
+RELATIONSHIP_LOOKUP_MAX_IDS = 300
+# Streaming data export (accounts.export): rows fetched per round trip and gzip level
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_GZIP_LEVEL = 6
+
+# Full-text post search (posts.search): terms honoured per query. The PostgreSQL text search
+# configuration is fixed by the search_vector column of posts migration 0005
+POST_SEARCH_MAX_TERMS = 8
+
+# Trending posts (posts.trending), rescored by refresh_trending every minute
+TRENDING_WINDOW_HOURS = 48
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 3.0
+TRENDING_BATCH_SIZE = 5000
+
+# Seconds a post's serialized JSON fragment is cached (posts.representations)
+POST_REPRESENTATION_CACHE_TIMEOUT = 300
+
+# Anonymous post list/detail responses (posts.response_cache): fresh for TIMEOUT seconds,
+# then served stale for up to STALE_TIMEOUT more while one worker rebuilds them
+ANON_RESPONSE_CACHE_TIMEOUT = 30
+ANON_RESPONSE_CACHE_STALE_TIMEOUT = 60
+ANON_RESPONSE_CACHE_LOCK_TIMEOUT = 10
+ANON_RESPONSE_CACHE_WAIT = 0.5
+
 ALLOWED_HOSTS = ['masri.com', 'www.masri.com', '192.168.0.0']
 
 
@@ -104,6 +177,18 @@ DATABASES = {
 }
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
 
+# Shared by every worker: conditional GET versions, anonymous response cache generations and locks,
+# unread badge counts and like-rate counters must be seen by all processes (Django's RedisCache needs
+# the redis package). On a process-local cache those features turn off, see social_media_api.caching;
+# CACHE_SINGLE_PROCESS = True keeps them on when one process serves every request
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://masri:6379/0'),
+    }
+}
+CACHE_SINGLE_PROCESS = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators